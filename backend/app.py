@@ -1,21 +1,95 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import json
+import time
+import queue
+import hashlib
 import sqlite3
+import threading
 import jwt
-import datetime
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 import random
+import multiprocessing
+from hashing import timed_call
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 app.config['SECRET_KEY'] = 'your-secret-key'  # 用于JWT加密
 
+# 数据库文件固定放在本文件所在目录，与启动时的工作目录无关；可以用环境变量 ZODIAC_DB 指定
+DB_PATH = os.environ.get('ZODIAC_DB') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zodiac.db')
+
+# 连接池中最多保留的空闲连接数，超出的连接用完后直接关闭
+DB_POOL_SIZE = 16
+
+# 每个连接启用的 PRAGMA：WAL 模式下读写互不阻塞，写锁被占用时最多等待 busy_timeout 毫秒，
+# cache_size 为负数表示以KB为单位的页缓存大小
+DB_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -8000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# 常用SQL语句，同一连接重复执行相同的语句时直接复用已编译的语句
+SQL_USER_BY_USERNAME = 'SELECT * FROM users WHERE username = ?'
+SQL_USER_ID_BY_USERNAME = 'SELECT id FROM users WHERE username = ?'
+SQL_USER_ID_BY_EMAIL = 'SELECT id FROM users WHERE email = ?'
+SQL_INSERT_USER = 'INSERT INTO users (username, password, email, birthdate) VALUES (?, ?, ?, ?)'
+
+_db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+def connect_db():
+    """新建一个数据库连接并设置 PRAGMA"""
+    conn = sqlite3.connect(DB_PATH, timeout=5, check_same_thread=False, cached_statements=128)
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@contextmanager
+def get_db():
+    """
+    从连接池借用一个数据库连接，代码块正常结束时提交事务，出现异常时回滚，结束后归还连接
+    
+    Flask开发服务器每个请求使用一个新线程，因此使用连接池而不是每个线程一个连接
+    """
+    try:
+        conn = _db_pool.get_nowait()
+    except queue.Empty:
+        conn = connect_db()
+    
+    broken = False
+    try:
+        with conn:
+            yield conn
+    except sqlite3.Error as e:
+        # 违反唯一约束等数据错误不影响连接，其他数据库错误时连接可能已经不可用，不再放回连接池
+        broken = not isinstance(e, sqlite3.IntegrityError)
+        raise
+    finally:
+        if broken:
+            conn.close()
+        else:
+            try:
+                _db_pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
 # 数据库初始化
 def init_db():
-    conn = sqlite3.connect('zodiac.db')
+    # 使用单独的连接，避免在多进程服务器 fork 之前把连接放进连接池
+    conn = connect_db()
     c = conn.cursor()
     
+    # WAL 模式会保存在数据库文件中，只需设置一次
+    c.execute('PRAGMA journal_mode = WAL')
+    
     # 创建用户表
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -31,39 +105,156 @@ def init_db():
     conn.commit()
     conn.close()
 
+# 密码哈希有意设计得很耗CPU，放到单独的进程池中计算，避免登录高峰占满请求线程、拖慢其他接口。
+# HASH_MAX_PENDING 为同时提交（计算中和排队中）的哈希任务上限，超出时直接返回503
+HASH_WORKERS = int(os.environ.get('ZODIAC_HASH_WORKERS') or max(1, (os.cpu_count() or 2) // 2))
+HASH_MAX_PENDING = int(os.environ.get('ZODIAC_HASH_MAX_PENDING') or HASH_WORKERS * 4)
+HASH_TIMEOUT = 10
+
+# 哈希耗时统计保留的最近样本数
+HASH_SAMPLE_SIZE = 1000
+
+class HashPoolBusy(Exception):
+    """密码哈希进程池已满或等待超时"""
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_hash_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+_hash_stats_lock = threading.Lock()
+_hash_stats = {'completed': 0, 'rejected': 0, 'timeouts': 0, 'pending': 0, 'pool_resets': 0}
+_hash_samples = deque(maxlen=HASH_SAMPLE_SIZE)
+
+def get_hash_pool():
+    """首次使用时创建哈希进程池（在多进程服务器 fork 之后才创建）"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        return _hash_pool
+
+def reset_hash_pool(broken_pool):
+    """哈希进程意外退出（被系统结束或崩溃）后进程池不再可用，丢弃该进程池，下次使用时重新创建"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is broken_pool:
+            _hash_pool = None
+    broken_pool.shutdown(wait=False)
+    _count_hash_event('pool_resets')
+
+def _count_hash_event(event, delta=1):
+    with _hash_stats_lock:
+        _hash_stats[event] += delta
+
+def _release_hash_slot(_):
+    _count_hash_event('pending', -1)
+    _hash_slots.release()
+
+def run_hash(func, *args):
+    """
+    在哈希进程池中执行 generate_password_hash / check_password_hash 并返回结果
+    
+    已提交的任务达到 HASH_MAX_PENDING 或等待超过 HASH_TIMEOUT 秒时抛出 HashPoolBusy
+    """
+    if not _hash_slots.acquire(blocking=False):
+        _count_hash_event('rejected')
+        raise HashPoolBusy('密码校验繁忙')
+    
+    start = time.perf_counter()
+    _count_hash_event('pending')
+    future = None
+    try:
+        # 进程池损坏时换一个新的进程池重试一次
+        for _ in range(2):
+            pool = get_hash_pool()
+            future = None
+            try:
+                future = pool.submit(timed_call, func, *args)
+                result, compute_time = future.result(timeout=HASH_TIMEOUT)
+                break
+            except BrokenProcessPool:
+                reset_hash_pool(pool)
+        else:
+            raise HashPoolBusy('密码校验进程异常')
+    except FutureTimeoutError:
+        _count_hash_event('timeouts')
+        raise HashPoolBusy('密码校验超时')
+    finally:
+        # 任务真正结束后才释放名额，超时返回的请求不会让进程池中堆积更多任务
+        if future is None:
+            _release_hash_slot(None)
+        else:
+            future.add_done_callback(_release_hash_slot)
+    
+    total_time = time.perf_counter() - start
+    with _hash_stats_lock:
+        _hash_stats['completed'] += 1
+        _hash_samples.append((total_time, compute_time))
+    return result
+
+def busy_response():
+    return jsonify({'error': '服务器繁忙，请稍后重试'}), 503, {'Retry-After': '1'}
+
+def percentile(values, p):
+    """已排序列表的百分位数"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+# 密码哈希统计：完成/拒绝/超时次数、当前任务数，以及最近样本的总耗时和排队耗时（毫秒）
+@app.route('/api/metrics/hash', methods=['GET'])
+def get_hash_metrics():
+    with _hash_stats_lock:
+        stats = dict(_hash_stats)
+        samples = list(_hash_samples)
+    
+    total = sorted(sample[0] * 1000 for sample in samples)
+    waiting = sorted((sample[0] - sample[1]) * 1000 for sample in samples)
+    stats.update({
+        'workers': HASH_WORKERS,
+        'max_pending': HASH_MAX_PENDING,
+        'latency_ms': {
+            'p50': round(percentile(total, 50), 1),
+            'p95': round(percentile(total, 95), 1),
+            'p99': round(percentile(total, 99), 1),
+            'max': round(total[-1], 1) if total else 0.0
+        },
+        'queue_wait_ms': {
+            'p50': round(percentile(waiting, 50), 1),
+            'p95': round(percentile(waiting, 95), 1)
+        }
+    })
+    return jsonify(stats)
+
 # 用户注册
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
     
     try:
-        conn = sqlite3.connect('zodiac.db')
-        c = conn.cursor()
+        with get_db() as conn:
+            # 检查用户名是否已存在
+            if conn.execute(SQL_USER_ID_BY_USERNAME, (data['username'],)).fetchone() is not None:
+                return jsonify({'error': '用户名已存在'}), 400
+            
+            # 检查邮箱是否已存在
+            if conn.execute(SQL_USER_ID_BY_EMAIL, (data['email'],)).fetchone() is not None:
+                return jsonify({'error': '邮箱已被注册'}), 400
         
-        # 检查用户名是否已存在
-        c.execute('SELECT id FROM users WHERE username = ?', (data['username'],))
-        if c.fetchone() is not None:
-            return jsonify({'error': '用户名已存在'}), 400
+        # 创建新用户（计算密码哈希时不占用数据库连接）
+        hashed_password = run_hash(generate_password_hash, data['password'])
+        with get_db() as conn:
+            conn.execute(SQL_INSERT_USER, (data['username'], hashed_password, data['email'], data['birthdate']))
         
-        # 检查邮箱是否已存在
-        c.execute('SELECT id FROM users WHERE email = ?', (data['email'],))
-        if c.fetchone() is not None:
-            return jsonify({'error': '邮箱已被注册'}), 400
-        
-        # 创建新用户
-        hashed_password = generate_password_hash(data['password'])
-        c.execute('''
-            INSERT INTO users (username, password, email, birthdate)
-            VALUES (?, ?, ?, ?)
-        ''', (data['username'], hashed_password, data['email'], data['birthdate']))
-        
-        conn.commit()
         return jsonify({'message': '注册成功'}), 201
         
+    except sqlite3.IntegrityError:
+        # 检查之后、写入之前被其他请求抢先注册
+        return jsonify({'error': '用户名或邮箱已被注册'}), 400
+    except HashPoolBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
 
 # 用户登录
 @app.route('/api/login', methods=['POST'])
@@ -71,24 +262,21 @@ def login():
     data = request.get_json()
     
     try:
-        conn = sqlite3.connect('zodiac.db')
-        c = conn.cursor()
-        
         # 查找用户
-        c.execute('SELECT * FROM users WHERE username = ?', (data['username'],))
-        user = c.fetchone()
+        with get_db() as conn:
+            user = conn.execute(SQL_USER_BY_USERNAME, (data['username'],)).fetchone()
         
         if user is None:
             return jsonify({'error': '用户不存在'}), 404
         
-        if not check_password_hash(user[2], data['password']):
+        if not run_hash(check_password_hash, user[2], data['password']):
             return jsonify({'error': '密码错误'}), 401
         
         # 生成 JWT token
         token = jwt.encode({
             'user_id': user[0],
             'username': user[1],
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(days=1)
+            'exp': datetime.utcnow() + timedelta(days=1)
         }, app.config['SECRET_KEY'])
         
         return jsonify({
@@ -100,10 +288,10 @@ def login():
             }
         })
         
+    except HashPoolBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
 
 # 添加星座基础数据
 ZODIAC_DATA = {
@@ -351,95 +539,221 @@ def get_zodiac_info(zodiac_sign):
         return jsonify({'error': '未找到该星座信息'}), 404
     return jsonify(zodiac_info)
 
-# 获取运势信息
-@app.route('/api/horoscope/<zodiac_sign>/<period>', methods=['GET'])
-def get_horoscope(zodiac_sign, period):
-    if zodiac_sign.lower() not in ZODIAC_DATA:
-        return jsonify({'error': '未找到该星座信息'}), 404
-        
-    if period not in ['daily', 'weekly', 'monthly', 'yearly']:
-        return jsonify({'error': '无效的时间周期'}), 400
+# 运势周期
+HOROSCOPE_PERIODS = ('daily', 'weekly', 'monthly', 'yearly')
 
-    # 获取星座基本信息
-    zodiac_info = ZODIAC_DATA[zodiac_sign.lower()]
-    
-    # 根据星座特点生成运势描述
-    def generate_description():
-        personality = zodiac_info['personality']
-        strengths = zodiac_info['strengths']
-        element = zodiac_info['element']
-        
-        descriptions = {
-            'daily': {
-                'overall': f'今天的{zodiac_info["name"]}整体运势不错，{personality[0]}的特质会带来好运。充分发挥{strengths[0]}，会有意外收获。',
-                'love': f'感情方面，{element}的特质让你魅力四射。单身的{zodiac_info["name"]}可能遇到心动的对象，已有伴侣的会享受甜蜜时光。',
-                'career': f'工作上，你的{strengths[1]}得到充分发挥。同事和领导都会欣赏你的表现，可能有加薪或升职的机会。',
-                'wealth': f'财运方面，建议发挥{zodiac_info["name"]}的{personality[1]}特质。适合投资理财，但要注意控制风险。',
-                'health': f'健康方面要注意调节。{zodiac_info["name"]}的{personality[2]}特质可能导致过度劳累，记得适当休息。'
-            },
-            'weekly': {
-                'overall': f'本周{zodiac_info["name"]}运势平稳，特别是在{strengths[0]}方面会有突出表现。',
-                'love': f'感情运势温和，{personality[3]}的特质会助你擦出爱情火花。已有伴侣的要多关心对方。',
-                'career': f'事业发展顺利，{strengths[2]}让你在工作中脱颖而出。可能收到重要项目或升职机会。',
-                'wealth': f'理财方面要发挥{zodiac_info["name"]}的{personality[1]}特质，合理规划支出，可能有意外收入。',
-                'health': f'保持{personality[4]}的生活态度，注意作息规律，适当运动放松。'
-            },
-            'monthly': {
-                'overall': f'本月{zodiac_info["name"]}运势起伏，以{strengths[0]}和{strengths[1]}应对挑战。',
-                'love': f'感情生活精彩，{element}的特质让你在感情中占据主动。单身者可能遇到理想对象。',
-                'career': f'工作上有新的机遇，充分发挥{strengths[2]}和{strengths[3]}，会有不错的发展。',
-                'wealth': f'财运较，适合规划长期投资。{zodiac_info["name"]}的{personality[1]}特质会带来财运。',
-                'health': f'健康状况稳定，保持{personality[4]}的生活态度，注意劳逸结合。'
-            },
-            'yearly': {
-                'overall': f'{zodiac_info["name"]}今年运势不错，{element}的能量带来好运。重点发展{strengths[0]}方面。',
-                'love': f'感情运势旺盛，{personality[3]}的特质让你在感情中收获满满。可能有重要的感情突破。',
-                'career': f'事业发展机会多，{strengths[1]}和{strengths[2]}会帮助你实现职业目标。',
-                'wealth': f'财运整体向好，{zodiac_info["name"]}的{personality[1]}特质会带来不错的收益。',
-                'health': f'身心健康是关键，保持{personality[4]}的生活态度，规律作息很重要。'
-            }
-        }
-        return descriptions[period]
+# 各周期的运势描述模板，占位符由 describe_horoscope 填入星座信息
+HOROSCOPE_TEMPLATES = {
+    'daily': {
+        'overall': '今天的{name}整体运势不错，{personality[0]}的特质会带来好运。充分发挥{strengths[0]}，会有意外收获。',
+        'love': '感情方面，{element}的特质让你魅力四射。单身的{name}可能遇到心动的对象，已有伴侣的会享受甜蜜时光。',
+        'career': '工作上，你的{strengths[1]}得到充分发挥。同事和领导都会欣赏你的表现，可能有加薪或升职的机会。',
+        'wealth': '财运方面，建议发挥{name}的{personality[1]}特质。适合投资理财，但要注意控制风险。',
+        'health': '健康方面要注意调节。{name}的{personality[2]}特质可能导致过度劳累，记得适当休息。'
+    },
+    'weekly': {
+        'overall': '本周{name}运势平稳，特别是在{strengths[0]}方面会有突出表现。',
+        'love': '感情运势温和，{personality[3]}的特质会助你擦出爱情火花。已有伴侣的要多关心对方。',
+        'career': '事业发展顺利，{strengths[2]}让你在工作中脱颖而出。可能收到重要项目或升职机会。',
+        'wealth': '理财方面要发挥{name}的{personality[1]}特质，合理规划支出，可能有意外收入。',
+        'health': '保持{personality[4]}的生活态度，注意作息规律，适当运动放松。'
+    },
+    'monthly': {
+        'overall': '本月{name}运势起伏，以{strengths[0]}和{strengths[1]}应对挑战。',
+        'love': '感情生活精彩，{element}的特质让你在感情中占据主动。单身者可能遇到理想对象。',
+        'career': '工作上有新的机遇，充分发挥{strengths[2]}和{strengths[3]}，会有不错的发展。',
+        'wealth': '财运较，适合规划长期投资。{name}的{personality[1]}特质会带来财运。',
+        'health': '健康状况稳定，保持{personality[4]}的生活态度，注意劳逸结合。'
+    },
+    'yearly': {
+        'overall': '{name}今年运势不错，{element}的能量带来好运。重点发展{strengths[0]}方面。',
+        'love': '感情运势旺盛，{personality[3]}的特质让你在感情中收获满满。可能有重要的感情突破。',
+        'career': '事业发展机会多，{strengths[1]}和{strengths[2]}会帮助你实现职业目标。',
+        'wealth': '财运整体向好，{name}的{personality[1]}特质会带来不错的收益。',
+        'health': '身心健康是关键，保持{personality[4]}的生活态度，规律作息很重要。'
+    }
+}
+
+# 预先生成的运势JSON，键为 (星座, 周期, 周期开始时间)，值为 (周期结束时间, JSON, ETag)。
+# 由后台线程在每个周期切换前生成并整体替换，请求只需查表
+HOROSCOPE_PAYLOADS = {}
+
+# 后台线程在每天零点（所有周期都在零点切换）之前多少秒生成下一周期的运势
+HOROSCOPE_PRERENDER_AHEAD = 60
+
+_horoscope_lock = threading.Lock()
+_horoscope_scheduler = None
+
+def period_bounds(period, now=None):
+    """返回当前周期的开始和结束时间（服务器本地时间）"""
+    now = now or datetime.now()
+    today = datetime(now.year, now.month, now.day)
+    if period == 'daily':
+        start = today
+        end = start + timedelta(days=1)
+    elif period == 'weekly':
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=7)
+    elif period == 'monthly':
+        start = today.replace(day=1)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    else:  # yearly
+        start = today.replace(month=1, day=1)
+        end = start.replace(year=start.year + 1)
+    return start, end
+
+def describe_horoscope(zodiac_info, period):
+    """根据星座特点生成指定周期的运势描述"""
+    fields = {
+        'name': zodiac_info['name'],
+        'element': zodiac_info['element'],
+        'personality': zodiac_info['personality'],
+        'strengths': zodiac_info['strengths']
+    }
+    return {aspect: template.format(**fields) for aspect, template in HOROSCOPE_TEMPLATES[period].items()}
 
-    # 生成运势数据
+def generate_horoscope(zodiac_sign, period, period_start):
+    """
+    生成运势数据
+    
+    评分由 (星座, 周期, 周期开始日期) 决定，同一周期内多次请求结果相同
+    """
+    seed = hashlib.sha256(f"{zodiac_sign}:{period}:{period_start.date().isoformat()}".encode('utf-8')).digest()
+    rng = random.Random(int.from_bytes(seed[:8], 'big'))
     fortune = {
-        'overall': random.choice(FORTUNE_RATINGS),
-        'love': random.choice(FORTUNE_RATINGS),
-        'career': random.choice(FORTUNE_RATINGS),
-        'wealth': random.choice(FORTUNE_RATINGS),
-        'health': random.choice(FORTUNE_RATINGS),
-        'description': generate_description()
+        'overall': rng.choice(FORTUNE_RATINGS),
+        'love': rng.choice(FORTUNE_RATINGS),
+        'career': rng.choice(FORTUNE_RATINGS),
+        'wealth': rng.choice(FORTUNE_RATINGS),
+        'health': rng.choice(FORTUNE_RATINGS),
+        'description': describe_horoscope(ZODIAC_DATA[zodiac_sign], period)
     }
 
     # 添加时间信息
-    current_date = datetime.now()
     if period == 'daily':
-        date_info = current_date.strftime('%Y年%m月%d日')
+        date_info = period_start.strftime('%Y年%m月%d日')
     elif period == 'weekly':
-        week_start = current_date - timedelta(days=current_date.weekday())
-        week_end = week_start + timedelta(days=6)
-        date_info = f"{week_start.strftime('%Y年%m月%d日')} 至 {week_end.strftime('%Y年%m月%d日')}"
+        week_end = period_start + timedelta(days=6)
+        date_info = f"{period_start.strftime('%Y年%m月%d日')} 至 {week_end.strftime('%Y年%m月%d日')}"
     elif period == 'monthly':
-        date_info = current_date.strftime('%Y年%m月')
+        date_info = period_start.strftime('%Y年%m月')
     else:  # yearly
-        date_info = current_date.strftime('%Y年')
+        date_info = period_start.strftime('%Y年')
 
     fortune['period'] = {
         'type': period,
         'date': date_info
     }
+    return fortune
+
+def encode_horoscope(zodiac_sign, period, period_start, period_end):
+    """生成运势并编码为JSON，返回 (周期结束时间, JSON, ETag)"""
+    body = json.dumps(generate_horoscope(zodiac_sign, period, period_start), ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+    return period_end, body, hashlib.sha256(body).hexdigest()[:32]
+
+def refresh_horoscopes(at=None):
+    """
+    生成 at 时刻（默认当前）所在周期的全部运势（12个星座 x 4个周期），已有的直接复用，
+    与尚未过期的运势合并后整体替换 HOROSCOPE_PAYLOADS
+    
+    传入下一周期的时间即可在周期切换前预先生成
+    """
+    global HOROSCOPE_PAYLOADS
+    with _horoscope_lock:
+        now = datetime.now()
+        payloads = {key: value for key, value in HOROSCOPE_PAYLOADS.items() if value[0] > now}
+        for period in HOROSCOPE_PERIODS:
+            start, end = period_bounds(period, at or now)
+            for zodiac_sign in ZODIAC_DATA:
+                key = (zodiac_sign, period, start)
+                if key not in payloads:
+                    payloads[key] = encode_horoscope(zodiac_sign, period, start, end)
+        HOROSCOPE_PAYLOADS = payloads
+
+def _wait_until(moment, stop_event):
+    """等待到指定时间，每分钟重新计算一次以应对系统时间调整；收到停止信号时返回False"""
+    while True:
+        remaining = (moment - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return True
+        if stop_event.wait(min(remaining, 60)):
+            return False
+
+def run_horoscope_scheduler(stop_event):
+    """后台线程：每天零点前生成下一周期的运势，零点后清理过期的运势"""
+    while not stop_event.is_set():
+        try:
+            refresh_horoscopes()
+        except Exception as e:
+            app.logger.error(f"生成运势失败: {e}")
+        
+        rollover = period_bounds('daily')[1]
+        if not _wait_until(rollover - timedelta(seconds=HOROSCOPE_PRERENDER_AHEAD), stop_event):
+            return
+        try:
+            refresh_horoscopes(rollover)
+        except Exception as e:
+            app.logger.error(f"预先生成运势失败: {e}")
+        if not _wait_until(rollover, stop_event):
+            return
+
+def start_horoscope_scheduler():
+    """启动运势预生成线程（已在运行时不重复启动），返回停止信号"""
+    global _horoscope_scheduler
+    with _horoscope_lock:
+        if _horoscope_scheduler is None or not _horoscope_scheduler[0].is_alive():
+            stop_event = threading.Event()
+            thread = threading.Thread(target=run_horoscope_scheduler, args=(stop_event,), daemon=True)
+            thread.start()
+            _horoscope_scheduler = (thread, stop_event)
+        return _horoscope_scheduler[1]
 
-    return jsonify(fortune)
+def get_horoscope_payload(zodiac_sign, period, now=None):
+    """
+    返回当前周期的 (周期结束时间, JSON, ETag)
+    
+    预生成的运势缺失时（后台线程尚未完成或已经停止，例如多进程服务器 fork 之后）同步生成，
+    并重新启动后台线程
+    """
+    start, end = period_bounds(period, now)
+    payload = HOROSCOPE_PAYLOADS.get((zodiac_sign, period, start))
+    if payload is None:
+        start_horoscope_scheduler()
+        payload = encode_horoscope(zodiac_sign, period, start, end)
+    return payload
+
+# 获取运势信息
+@app.route('/api/horoscope/<zodiac_sign>/<period>', methods=['GET'])
+def get_horoscope(zodiac_sign, period):
+    if zodiac_sign.lower() not in ZODIAC_DATA:
+        return jsonify({'error': '未找到该星座信息'}), 404
+        
+    if period not in HOROSCOPE_PERIODS:
+        return jsonify({'error': '无效的时间周期'}), 400
+
+    now = datetime.now()
+    end, body, etag = get_horoscope_payload(zodiac_sign.lower(), period, now)
+
+    # 运势在周期结束前不会变化，浏览器和代理可以缓存到周期结束；内容未变化时返回304
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max(0, int((end - now).total_seconds()))
+    response.expires = datetime.fromtimestamp(end.timestamp(), timezone.utc)
+    return response.make_conditional(request)
 
 # 添加配对分析API
 @app.route('/api/compatibility/<zodiac1>/<zodiac2>', methods=['GET'])
 def get_compatibility(zodiac1, zodiac2):
-    zodiac1 = zodiac1.lower()
-    zodiac2 = zodiac2.lower()
-    
-    if zodiac1 not in ZODIAC_DATA or zodiac2 not in ZODIAC_DATA:
+    # 所有配对结果在启动时已经编码为JSON，这里只需查表
+    body = COMPATIBILITY_RESPONSES.get((zodiac1.lower(), zodiac2.lower()))
+    if body is None:
         return jsonify({'error': '无效的星座'}), 400
-        
+    return app.response_class(body, mimetype='application/json')
+
+def build_compatibility(zodiac1, zodiac2):
+    """构建两个星座的配对分析结果"""
     # 获取两个星座的基本信息
     zodiac1_info = ZODIAC_DATA[zodiac1]
     zodiac2_info = ZODIAC_DATA[zodiac2]
@@ -455,7 +769,7 @@ def get_compatibility(zodiac1, zodiac2):
         compatibility = generate_default_compatibility(zodiac1_info, zodiac2_info)
     
     # 构建详细的配对分析
-    result = {
+    return {
         'score': compatibility['score'],
         'analysis': {
             'overall': compatibility['love'],
@@ -474,8 +788,6 @@ def get_compatibility(zodiac1, zodiac2):
             'personality': zodiac2_info['personality'][:3]
         }
     }
-    
-    return jsonify(result)
 
 def generate_default_compatibility(zodiac1, zodiac2):
     """生成默认的配对分析数据"""
@@ -520,6 +832,35 @@ def calculate_element_compatibility(element1, element2):
     pair = tuple(sorted([element1, element2]))
     return element_scores.get(pair, 75)  # 默认返回75分
 
-if __name__ == '__main__':
+# 12x12 个配对结果预先编码好的JSON，键为 (星座1, 星座2)
+COMPATIBILITY_RESPONSES = {}
+
+def reload_compatibility():
+    """
+    重新生成全部配对结果的JSON
+    
+    修改 ZODIAC_DATA 或 ZODIAC_COMPATIBILITY 后调用；新结果全部生成后整体替换，
+    正在处理的请求不会读到一半新一半旧的数据
+    """
+    global COMPATIBILITY_RESPONSES
+    COMPATIBILITY_RESPONSES = {
+        (zodiac1, zodiac2): json.dumps(build_compatibility(zodiac1, zodiac2), ensure_ascii=False,
+                                       separators=(',', ':')).encode('utf-8')
+        for zodiac1 in ZODIAC_DATA
+        for zodiac2 in ZODIAC_DATA
+    }
+
+def init_app():
+    """初始化数据库、生成全部配对结果和运势并启动运势预生成线程"""
     init_db()
+    reload_compatibility()
+    refresh_horoscopes()
+    start_horoscope_scheduler()
+
+# 模块加载时初始化，通过 flask run 或 WSGI 服务器启动时同样生效；
+# 以 spawn 方式启动的哈希进程会重新导入主模块，子进程中不重复初始化
+if multiprocessing.parent_process() is None:
+    init_app()
+
+if __name__ == '__main__':
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""
+在密码哈希进程池中执行的函数
+
+单独放在一个没有副作用的模块中：以 spawn 方式启动的哈希进程（Windows、macOS）只需导入本模块，
+不会重新导入 app.py、初始化数据库或启动后台线程
+"""
+
+import time
+
+def timed_call(func, *args):
+    """在哈希进程中执行，返回结果和计算耗时"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后端运势接口测试：周期边界、周期切换前的预生成以及 ETag/304 缓存
+
+运行: python -m pytest -q backend/test_app.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_cors')
+pytest.importorskip('jwt')
+
+# 使用临时数据库，避免测试写入 backend/zodiac.db
+os.environ.setdefault('ZODIAC_DB', os.path.join(tempfile.mkdtemp(), 'zodiac.db'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as backend
+
+
+def test_daily_bounds():
+    start, end = backend.period_bounds('daily', datetime(2026, 3, 15, 13, 45))
+    assert start == datetime(2026, 3, 15)
+    assert end == datetime(2026, 3, 16)
+
+
+def test_weekly_bounds_start_on_monday():
+    # 2026-03-15 是星期日，所在的周从 2026-03-09（星期一）开始
+    start, end = backend.period_bounds('weekly', datetime(2026, 3, 15, 23, 59))
+    assert start == datetime(2026, 3, 9)
+    assert start.weekday() == 0
+    assert end == datetime(2026, 3, 16)
+    # 星期一零点已经属于新的一周
+    assert backend.period_bounds('weekly', datetime(2026, 3, 16))[0] == datetime(2026, 3, 16)
+
+
+def test_bounds_at_year_end():
+    now = datetime(2026, 12, 31, 23, 59, 59)
+    assert backend.period_bounds('daily', now) == (datetime(2026, 12, 31), datetime(2027, 1, 1))
+    assert backend.period_bounds('weekly', now) == (datetime(2026, 12, 28), datetime(2027, 1, 4))
+    assert backend.period_bounds('monthly', now) == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+    assert backend.period_bounds('yearly', now) == (datetime(2026, 1, 1), datetime(2027, 1, 1))
+
+
+def test_horoscope_is_deterministic_per_period():
+    start = datetime(2026, 3, 9)
+    first = backend.generate_horoscope('aries', 'weekly', start)
+    assert backend.generate_horoscope('aries', 'weekly', start) == first
+    assert backend.encode_horoscope('aries', 'weekly', start, start + timedelta(days=7)) == \
+        backend.encode_horoscope('aries', 'weekly', start, start + timedelta(days=7))
+
+
+def test_next_period_is_prerendered_before_rollover():
+    rollover = backend.period_bounds('daily')[1]
+    backend.refresh_horoscopes(rollover)
+    for period in backend.HOROSCOPE_PERIODS:
+        start, _ = backend.period_bounds(period, rollover)
+        for zodiac_sign in backend.ZODIAC_DATA:
+            payload = backend.HOROSCOPE_PAYLOADS.get((zodiac_sign, period, start))
+            assert payload is not None
+            assert backend.get_horoscope_payload(zodiac_sign, period, rollover) is payload
+    # 当前周期的运势仍然保留，切换前的请求不受影响
+    today = backend.period_bounds('daily')[0]
+    assert ('aries', 'daily', today) in backend.HOROSCOPE_PAYLOADS
+
+
+def test_horoscope_etag_and_not_modified():
+    client = backend.app.test_client()
+    response = client.get('/api/horoscope/aries/daily')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag
+    assert 'public' in response.headers['Cache-Control']
+    assert 'max-age=' in response.headers['Cache-Control']
+    assert response.headers['Expires']
+
+    cached = client.get('/api/horoscope/aries/daily', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    changed = client.get('/api/horoscope/aries/daily', headers={'If-None-Match': '"other"'})
+    assert changed.status_code == 200
+    assert changed.data == response.data
+
+
+def test_horoscope_rejects_unknown_period():
+    client = backend.app.test_client()
+    assert client.get('/api/horoscope/aries/hourly').status_code == 400
+    assert client.get('/api/horoscope/unknown/daily').status_code == 404
+
+
+@pytest.fixture
+def exhausted_hash_slots():
+    """占满密码哈希的全部名额，结束后归还"""
+    taken = 0
+    while backend._hash_slots.acquire(blocking=False):
+        taken += 1
+    yield
+    for _ in range(taken):
+        backend._hash_slots.release()
+
+
+def test_run_hash_rejects_when_busy(exhausted_hash_slots):
+    rejected = backend._hash_stats['rejected']
+    with pytest.raises(backend.HashPoolBusy):
+        backend.run_hash(pow, 2, 10)
+    assert backend._hash_stats['rejected'] == rejected + 1
+
+
+def test_register_returns_503_when_busy(exhausted_hash_slots):
+    client = backend.app.test_client()
+    response = client.post('/api/register', json={
+        'username': 'busy-user', 'password': 'secret', 'email': 'busy@example.com', 'birthdate': '2000-01-01'
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_run_hash_replaces_broken_pool():
+    assert backend.run_hash(pow, 2, 10) == 1024
+    resets = backend._hash_stats['pool_resets']
+    # 哈希进程直接退出，进程池损坏；换新进程池重试一次仍然失败后返回繁忙
+    with pytest.raises(backend.HashPoolBusy):
+        backend.run_hash(os._exit, 1)
+    assert backend._hash_stats['pool_resets'] == resets + 2
+    # 之后的请求使用新的进程池
+    assert backend.run_hash(pow, 3, 3) == 27
+
+
+def test_hash_metrics():
+    backend.run_hash(pow, 2, 8)
+    client = backend.app.test_client()
+    response = client.get('/api/metrics/hash')
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert stats['completed'] >= 1
+    assert stats['workers'] == backend.HASH_WORKERS
+    assert stats['max_pending'] == backend.HASH_MAX_PENDING
+    assert set(stats['latency_ms']) == {'p50', 'p95', 'p99', 'max'}
+    assert set(stats['queue_wait_ms']) == {'p50', 'p95'}
+    assert stats['latency_ms']['max'] >= stats['latency_ms']['p50'] >= 0
+
+
+def test_db_connections_use_wal_and_pragmas():
+    with backend.get_db() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == -8000
+
+
+def test_db_connection_is_reused():
+    with backend.get_db() as first:
+        pass
+    with backend.get_db() as second:
+        assert second is first
+
+
+def test_db_connection_returned_after_rollback():
+    with pytest.raises(ValueError):
+        with backend.get_db() as conn:
+            conn.execute(backend.SQL_INSERT_USER, ('rollback-user', 'x', 'rollback@example.com', None))
+            raise ValueError('abort')
+    with backend.get_db() as again:
+        assert again is conn
+        assert again.execute(backend.SQL_USER_ID_BY_USERNAME, ('rollback-user',)).fetchone() is None
+
+
+def test_db_connection_kept_after_integrity_error():
+    with backend.get_db() as conn:
+        conn.execute(backend.SQL_INSERT_USER, ('unique-user', 'x', 'unique@example.com', None))
+    with pytest.raises(backend.sqlite3.IntegrityError):
+        with backend.get_db() as conn:
+            conn.execute(backend.SQL_INSERT_USER, ('unique-user', 'x', 'other@example.com', None))
+    with backend.get_db() as again:
+        assert again is conn
+
+
+def test_db_connection_discarded_after_database_error():
+    with pytest.raises(backend.sqlite3.OperationalError):
+        with backend.get_db() as conn:
+            conn.execute('SELECT * FROM missing_table')
+    with backend.get_db() as again:
+        assert again is not conn
+    # 出错的连接已经关闭，不会再被使用
+    with pytest.raises(backend.sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+
+def legacy_compatibility(zodiac1, zodiac2):
+    """原来每次请求时计算配对结果的方式，用于核对预先生成的结果"""
+    zodiac1_info = backend.ZODIAC_DATA[zodiac1]
+    zodiac2_info = backend.ZODIAC_DATA[zodiac2]
+    compatibility = (backend.ZODIAC_COMPATIBILITY.get(zodiac1, {}).get(zodiac2)
+                     or backend.ZODIAC_COMPATIBILITY.get(zodiac2, {}).get(zodiac1)
+                     or backend.generate_default_compatibility(zodiac1_info, zodiac2_info))
+    return {
+        'score': compatibility['score'],
+        'analysis': {
+            'overall': compatibility['love'],
+            'relationship': compatibility['relationship'],
+            'advantages': compatibility['advantages'],
+            'disadvantages': compatibility['disadvantages']
+        },
+        'zodiac1': {
+            'name': zodiac1_info['name'],
+            'element': zodiac1_info['element'],
+            'personality': zodiac1_info['personality'][:3]
+        },
+        'zodiac2': {
+            'name': zodiac2_info['name'],
+            'element': zodiac2_info['element'],
+            'personality': zodiac2_info['personality'][:3]
+        }
+    }
+
+
+def test_compatibility_matrix_matches_per_request_results():
+    assert len(backend.COMPATIBILITY_RESPONSES) == 144
+    for zodiac1 in backend.ZODIAC_DATA:
+        for zodiac2 in backend.ZODIAC_DATA:
+            body = backend.COMPATIBILITY_RESPONSES[(zodiac1, zodiac2)]
+            assert json.loads(body) == legacy_compatibility(zodiac1, zodiac2)
+
+
+def test_compatibility_endpoint():
+    client = backend.app.test_client()
+    response = client.get('/api/compatibility/Aries/LEO')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert response.get_json() == legacy_compatibility('aries', 'leo')
+    assert client.get('/api/compatibility/aries/unknown').status_code == 400
+    assert client.get('/api/compatibility/unknown/leo').status_code == 400
+    assert client.get('/api/compatibility/aries').status_code == 404
+
+
+def test_reload_compatibility(monkeypatch):
+    custom = {'score': 42, 'love': '测试', 'relationship': '测试', 'advantages': ['a'], 'disadvantages': ['b']}
+    monkeypatch.setitem(backend.ZODIAC_COMPATIBILITY, 'aries', dict(backend.ZODIAC_COMPATIBILITY.get('aries', {}),
+                                                                     virgo=custom))
+    before = backend.COMPATIBILITY_RESPONSES
+    backend.reload_compatibility()
+    try:
+        assert backend.COMPATIBILITY_RESPONSES is not before
+        assert json.loads(backend.COMPATIBILITY_RESPONSES[('aries', 'virgo')])['score'] == 42
+        # 反向配对同样使用新的数据
+        assert json.loads(backend.COMPATIBILITY_RESPONSES[('virgo', 'aries')]) == \
+            legacy_compatibility('virgo', 'aries')
+    finally:
+        monkeypatch.undo()
+        backend.reload_compatibility()
+    assert backend.COMPATIBILITY_RESPONSES[('aries', 'virgo')] == before[('aries', 'virgo')]
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML转图片性能基准测试
+生成合成的HTML测试页面（卡片、长页面、图片密集、字体密集），在不同模式下批量转换，
+记录吞吐量、单页耗时百分位数和内存峰值，并与保存的基准结果对比，发现性能退化
+
+全部在本地使用无头Chrome运行，不需要网络连接:
+    python benchmark.py                          运行全部测试并与基准对比
+    python benchmark.py --save-baseline v1.2     运行并保存为基准 v1.2
+    python benchmark.py --corpus cards --mode serial-png --mode workers-4
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import random
+import argparse
+import datetime
+import threading
+from html_to_image import HTMLToImageConverter
+
+try:
+    import psutil
+except ImportError:
+    # 没有安装psutil时，Linux下从 /proc 读取内存占用
+    psutil = None
+
+# 测试模式：converter 为创建转换器的参数，batch 为 batch_convert 的参数
+MODES = {
+    'serial-png': {'converter': {}, 'batch': {'image_format': 'PNG'}},
+    'serial-jpeg-q80': {'converter': {}, 'batch': {'image_format': 'JPEG', 'quality': 80}},
+    'serial-webp-q80': {'converter': {}, 'batch': {'image_format': 'WEBP', 'quality': 80}},
+    'serial-jpeg-200k': {'converter': {},
+                         'batch': {'image_format': 'JPEG', 'encode_options': {'target_size': 200 * 1024}}},
+    'workers-4': {'converter': {}, 'batch': {'image_format': 'PNG', 'workers': 4}},
+    'tabs-4': {'converter': {}, 'batch': {'image_format': 'PNG', 'tabs': 4}},
+    'encode-processes-2': {'converter': {}, 'batch': {'image_format': 'JPEG', 'quality': 80, 'encode_processes': 2}},
+    'fixed-wait': {'converter': {'wait_strategy': 'fixed'}, 'batch': {'image_format': 'PNG'}},
+}
+
+DEFAULT_MODES = ['serial-png', 'serial-jpeg-q80', 'workers-4', 'tabs-4']
+
+CORPORA = ('cards', 'long', 'images', 'fonts')
+
+DEFAULT_BASELINE_FILE = 'benchmark_baseline.json'
+
+# 项目中的轮播图片，按本文件所在目录查找，与运行时的工作目录无关
+SLIDER_IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', 'slider')
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="UTF-8">
+<title>{title}</title>
+<style>
+body {{ margin: 0; font-family: "Microsoft YaHei", "PingFang SC", sans-serif; background: #f5f6fa; }}
+{style}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+def card_page(index, rng):
+    """小型静态卡片页面"""
+    style = """
+.card { width: 360px; margin: 40px auto; padding: 24px; border-radius: 16px; background: #fff;
+        box-shadow: 0 8px 24px rgba(0, 0, 0, 0.12); }
+.card h1 { margin: 0 0 12px; font-size: 28px; color: #4b3f9e; }
+.card p { line-height: 1.6; color: #555; }
+"""
+    body = (f'<div class="card"><h1>卡片 {index}</h1>'
+            f'<p>{"今日运势 " * rng.randint(5, 15)}</p>'
+            f'<p>幸运数字: {rng.randint(1, 99)}</p></div>')
+    return PAGE_TEMPLATE.format(title=f"卡片 {index}", style=style, body=body)
+
+def long_page(index, rng):
+    """超长滚动页面，高度远超窗口"""
+    style = """
+section { margin: 20px 40px; padding: 20px; background: #fff; border-left: 6px solid #6c5ce7; }
+section h2 { margin-top: 0; }
+"""
+    sections = []
+    for number in range(rng.randint(120, 200)):
+        sections.append(f'<section><h2>第 {number + 1} 节</h2><p>{"星座运势内容。" * rng.randint(10, 40)}</p></section>')
+    return PAGE_TEMPLATE.format(title=f"长页面 {index}", style=style, body="\n".join(sections))
+
+def image_page(index, rng, image_names):
+    """图片密集页面，引用同一目录下的图片文件"""
+    style = """
+.grid { display: flex; flex-wrap: wrap; gap: 12px; padding: 20px; }
+.grid img { width: 300px; height: 200px; object-fit: cover; border-radius: 8px; }
+"""
+    images = [f'<img src="assets/{rng.choice(image_names)}" alt="">' for _ in range(rng.randint(20, 40))]
+    body = f'<div class="grid">{"".join(images)}</div>'
+    return PAGE_TEMPLATE.format(title=f"图片页面 {index}", style=style, body=body)
+
+def font_page(index, rng):
+    """字体密集页面：大量本地字体、字重和字号组合"""
+    families = ['"Microsoft YaHei"', '"PingFang SC"', '"Noto Sans CJK SC"', 'SimSun', 'Georgia',
+                '"Times New Roman"', '"Courier New"', 'serif', 'monospace']
+    faces = []
+    for number, family in enumerate(families):
+        faces.append(f'@font-face {{ font-family: "Bench{number}"; src: local({family}); }}')
+    paragraphs = []
+    for number in range(rng.randint(80, 150)):
+        paragraphs.append(
+            f'<p style="font-family: Bench{rng.randrange(len(families))}, sans-serif; '
+            f'font-weight: {rng.choice([100, 300, 400, 500, 700, 900])}; '
+            f'font-size: {rng.randint(12, 36)}px; font-style: {rng.choice(["normal", "italic"])};">'
+            f'白羊座 金牛座 双子座 巨蟹座 Aries Taurus Gemini Cancer {number}</p>'
+        )
+    return PAGE_TEMPLATE.format(title=f"字体页面 {index}", style="\n".join(faces), body="\n".join(paragraphs))
+
+def prepare_images(assets_dir, rng):
+    """准备图片素材：优先使用项目中的轮播图片，没有时生成纯色图片"""
+    os.makedirs(assets_dir, exist_ok=True)
+    names = []
+    for path in sorted(glob.glob(os.path.join(SLIDER_IMAGES_DIR, '*.jpg'))):
+        name = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(assets_dir, name))
+        names.append(name)
+    if names:
+        return names
+
+    from PIL import Image
+    for number in range(6):
+        name = f"generated_{number}.jpg"
+        color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+        Image.new('RGB', (1200, 800), color).save(os.path.join(assets_dir, name), 'JPEG', quality=85)
+        names.append(name)
+    return names
+
+def generate_corpus(name, directory, pages, seed=0):
+    """
+    生成一组测试页面，返回HTML文件路径列表
+
+    参数:
+    name: 页面类型 ('cards', 'long', 'images', 'fonts')
+    directory: 输出目录
+    pages: 页面数量
+    seed: 随机种子，相同种子生成完全相同的页面，保证结果可重复
+    """
+    rng = random.Random(f"{name}-{seed}")
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+
+    image_names = prepare_images(os.path.join(directory, 'assets'), rng) if name == 'images' else None
+    files = []
+    for index in range(pages):
+        if name == 'cards':
+            html = card_page(index, rng)
+        elif name == 'long':
+            html = long_page(index, rng)
+        elif name == 'images':
+            html = image_page(index, rng, image_names)
+        else:
+            html = font_page(index, rng)
+        path = os.path.join(directory, f"{name}_{index:03d}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        files.append(path)
+    return files
+
+class RssSampler:
+    """后台线程定期采样当前进程及其子进程（浏览器、驱动、编码进程）的总内存占用，记录峰值"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def available():
+        return psutil is not None or os.path.exists('/proc/self/status')
+
+    def current_rss(self):
+        """当前进程树的总内存占用（字节）"""
+        if psutil is not None:
+            process = psutil.Process()
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+            return total
+        return self._proc_tree_rss(os.getpid())
+
+    @staticmethod
+    def _proc_tree_rss(root_pid):
+        """读取 /proc 计算进程树的内存占用"""
+        parents = {}
+        rss = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/status", encoding='utf-8') as f:
+                    fields = dict(line.split(':', 1) for line in f if ':' in line)
+            except OSError:
+                continue
+            pid = int(entry)
+            parents[pid] = int(fields.get('PPid', '0').strip() or 0)
+            rss[pid] = int(fields.get('VmRSS', '0 kB').split()[0]) * 1024
+
+        total = 0
+        pending = [root_pid]
+        while pending:
+            pid = pending.pop()
+            total += rss.get(pid, 0)
+            pending.extend(child for child, parent in parents.items() if parent == pid)
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.peak = max(self.peak, self.current_rss())
+            except Exception:
+                pass
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.available():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+def run_case(corpus_name, files, mode_name, output_dir, width, height, log):
+    """在指定模式下转换一组页面，返回测试结果"""
+    mode = MODES[mode_name]
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+
+    start = time.perf_counter()
+    with RssSampler() as sampler:
+        converter = HTMLToImageConverter(log_callback=log, use_daemon=False, **mode['converter'])
+        try:
+            success_count, total_count = converter.batch_convert(files, output_dir, width=width, height=height,
+                                                                 **mode['batch'])
+            report = converter.last_report
+        finally:
+            converter.close()
+    elapsed = time.perf_counter() - start
+
+    page = report['stages'].get('page', {})
+    return {
+        'corpus': corpus_name,
+        'mode': mode_name,
+        'pages': total_count,
+        'success': success_count,
+        # 吞吐量按批量转换本身计算，不包含浏览器启动时间
+        'pages_per_second': report['pages_per_second'],
+        'latency_p50': page.get('p50', 0.0),
+        'latency_p95': page.get('p95', 0.0),
+        'latency_max': page.get('max', 0.0),
+        'bytes_written': report['bytes_written'],
+        'peak_rss_mb': round(sampler.peak / 1024 / 1024, 1) if sampler.peak else None,
+        'total_seconds': round(elapsed, 3),
+        'stages': report['stages']
+    }
+
+def load_baselines(path):
+    """读取基准结果文件"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('baselines', {})
+
+def save_baseline(path, label, results):
+    """把本次结果保存为指定名称的基准"""
+    baselines = load_baselines(path)
+    baselines[label] = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'results': {f"{result['corpus']}/{result['mode']}": result for result in results}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'baselines': baselines}, f, ensure_ascii=False, indent=2)
+
+def compare(results, baseline, tolerance):
+    """
+    与基准对比，返回退化项列表
+
+    吞吐量下降或 p95 单页耗时上升超过 tolerance（比例）视为退化
+    """
+    regressions = []
+    for result in results:
+        key = f"{result['corpus']}/{result['mode']}"
+        previous = baseline['results'].get(key)
+        if not previous:
+            continue
+        if previous['pages_per_second'] and \
+                result['pages_per_second'] < previous['pages_per_second'] * (1 - tolerance):
+            regressions.append(f"{key}: 吞吐量 {previous['pages_per_second']:.2f} → "
+                               f"{result['pages_per_second']:.2f} 页/秒")
+        if previous['latency_p95'] and result['latency_p95'] > previous['latency_p95'] * (1 + tolerance):
+            regressions.append(f"{key}: p95耗时 {previous['latency_p95']:.3f} → {result['latency_p95']:.3f} 秒")
+    return regressions
+
+def print_results(results):
+    """打印结果表格"""
+    print()
+    print(f"{'测试':<30}{'页/秒':>8}{'p50(秒)':>10}{'p95(秒)':>10}{'最大(秒)':>10}{'内存峰值MB':>12}{'输出MB':>9}")
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.1f}" if result['peak_rss_mb'] else '-'
+        print(f"{result['corpus'] + '/' + result['mode']:<30}{result['pages_per_second']:>8.2f}"
+              f"{result['latency_p50']:>10.3f}{result['latency_p95']:>10.3f}{result['latency_max']:>10.3f}"
+              f"{rss:>12}{result['bytes_written'] / 1024 / 1024:>9.2f}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="HTML转图片性能基准测试")
+    parser.add_argument('--corpus', action='append', choices=CORPORA, help="测试页面类型，可重复指定 (默认全部)")
+    parser.add_argument('--mode', action='append', choices=sorted(MODES),
+                        help=f"测试模式，可重复指定 (默认 {', '.join(DEFAULT_MODES)})")
+    parser.add_argument('--pages', type=int, default=12, help="每种页面生成的数量 (默认 12)")
+    parser.add_argument('--width', type=int, default=1280, help="页面宽度 (默认 1280)")
+    parser.add_argument('--height', type=int, default=800, help="页面高度 (默认 800)")
+    parser.add_argument('--seed', type=int, default=0, help="生成页面的随机种子 (默认 0)")
+    parser.add_argument('--work-dir', default='benchmark_output', help="测试页面和输出图片目录 (默认 benchmark_output)")
+    parser.add_argument('--baseline-file', default=DEFAULT_BASELINE_FILE,
+                        help=f"基准结果文件 (默认 {DEFAULT_BASELINE_FILE})")
+    parser.add_argument('--compare', metavar='LABEL', help="与指定名称的基准对比 (默认最近保存的基准)")
+    parser.add_argument('--save-baseline', metavar='LABEL', help="把本次结果保存为指定名称的基准")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="允许的性能波动比例 (默认 0.15)")
+    parser.add_argument('--json', metavar='PATH', help="把本次结果导出为JSON")
+    parser.add_argument('--verbose', action='store_true', help="输出转换日志")
+    args = parser.parse_args()
+
+    corpora = args.corpus or list(CORPORA)
+    modes = args.mode or DEFAULT_MODES
+
+    def log(message):
+        if args.verbose:
+            print(message, flush=True)
+
+    print("=== HTML转图片性能基准测试 ===")
+    if not RssSampler.available():
+        print("⚠️  未安装psutil，无法统计内存峰值 (pip install psutil)")
+
+    results = []
+    for corpus_name in corpora:
+        files = generate_corpus(corpus_name, os.path.join(args.work_dir, 'corpus', corpus_name), args.pages,
+                                args.seed)
+        print(f"📄 已生成 {corpus_name} 测试页面 {len(files)} 个")
+        for mode_name in modes:
+            print(f"⏱️  正在测试: {corpus_name}/{mode_name}")
+            output_dir = os.path.join(args.work_dir, 'output', corpus_name, mode_name)
+            try:
+                result = run_case(corpus_name, files, mode_name, output_dir, args.width, args.height, log)
+            except Exception as e:
+                print(f"❌ 测试失败 {corpus_name}/{mode_name}: {e}")
+                continue
+            if result['success'] < result['pages']:
+                print(f"⚠️  {corpus_name}/{mode_name}: 只有 {result['success']}/{result['pages']} 个页面转换成功")
+            results.append(result)
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已导出: {args.json}")
+
+    exit_code = 0
+    baselines = load_baselines(args.baseline_file)
+    label = args.compare or (max(baselines, key=lambda name: baselines[name]['created']) if baselines else None)
+    if label:
+        if label not in baselines:
+            print(f"\n❌ 基准 {label} 不存在")
+            exit_code = 1
+        else:
+            regressions = compare(results, baselines[label], args.tolerance)
+            if regressions:
+                print(f"\n⚠️  与基准 {label} 相比发现性能退化:")
+                for line in regressions:
+                    print(f"  - {line}")
+                exit_code = 1
+            else:
+                print(f"\n✅ 与基准 {label} 相比没有性能退化（允许波动 {args.tolerance:.0%}）")
+
+    if args.save_baseline:
+        save_baseline(args.baseline_file, args.save_baseline, results)
+        print(f"💾 已保存基准 {args.save_baseline}: {args.baseline_file}")
+
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -3,38 +3,1746 @@
 """
 HTML转图片工具 - GUI版本
 支持批量将HTML文件转换为PNG和JPEG格式的图片
+
+不带参数运行时启动图形界面，带参数运行时进入命令行模式（python html_to_image.py --help 查看用法）
 """
 
 import os
 import sys
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from tkinter import scrolledtext
+import base64
+import io
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+    from tkinter import scrolledtext
+except ImportError:
+    # 没有图形界面环境的服务器上仍然可以使用命令行模式
+    tk = None
 import threading
+import queue
+import multiprocessing
+import mmap
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from PIL import Image
+try:
+    # 用于结束卡死浏览器的子进程和统计内存占用，未安装时只结束驱动进程
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    # 旧版本Pillow需要通过插件支持AVIF格式
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
 import time
 import glob
+import re
+import shutil
+import hashlib
+import json
+import csv
+import contextlib
+import urllib.request
+import urllib.error
+import urllib.parse
+import argparse
+import html as html_lib
+import mimetypes
+import secrets
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 页面就绪检测：记录最近一次DOM变化时间的监听脚本（可重复注入）
+READY_TRACKER_JS = """
+(function () {
+    if (window.__html2img) { return; }
+    var state = window.__html2img = {lastMutation: performance.now()};
+    try {
+        new MutationObserver(function () { state.lastMutation = performance.now(); })
+            .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    } catch (e) {}
+})();
+"""
+
+# 页面就绪检测：采集文档状态、字体、图片和网络/DOM静默时长
+READY_PROBE_JS = """
+var state = window.__html2img || {lastMutation: 0};
+var images = Array.prototype.slice.call(document.images || []);
+var resources = performance.getEntriesByType('resource');
+var lastResource = 0;
+for (var i = 0; i < resources.length; i++) {
+    lastResource = Math.max(lastResource, resources[i].responseEnd);
+}
+return {
+    url: location.href,
+    readyState: document.readyState,
+    fonts: document.fonts ? document.fonts.status : 'loaded',
+    imagesPending: images.filter(function (img) { return !img.complete && img.loading !== 'lazy'; }).length,
+    resources: resources.length,
+    idle: performance.now() - Math.max(state.lastMutation, lastResource)
+};
+"""
+
+# 渲染守护进程的默认监听地址，可通过环境变量 HTML2IMG_DAEMON 修改（设为 off 可禁用）
+DEFAULT_DAEMON_ADDRESS = '127.0.0.1:8765'
+
+# 守护进程的访问令牌请求头；令牌在守护进程启动时随机生成，写入只有当前用户可读的令牌文件，
+# 也可以通过环境变量 HTML2IMG_DAEMON_TOKEN 传给客户端
+DAEMON_TOKEN_HEADER = 'X-Render-Token'
+
+def daemon_token_path(address):
+    """守护进程令牌文件的路径（每个监听端口一个文件）"""
+    port = address.rsplit(':', 1)[-1]
+    return os.path.join(os.path.expanduser('~'), f'.html2img_daemon_{port}.token')
+
+# HTML/CSS中引用本地资源的写法：src/href属性、CSS的url()和@import
+# （分组依次为: 属性名, 属性值, url()内容, @import路径）
+ASSET_REFERENCE_PATTERN = re.compile(
+    r"""(?:\b(src|href)\s*=\s*["']([^"']+)["'])"""
+    r"""|(?:url\(\s*["']?([^"')]+?)["']?\s*\))"""
+    r"""|(?:@import\s+["']([^"']+)["'])""",
+    re.IGNORECASE
+)
+
+# 渲染缓存格式版本，渲染流程发生不兼容变化时修改以使旧缓存失效
+RENDER_CACHE_VERSION = 1
+
+# 默认拦截的远程请求：统计分析和远程字体等，渲染截图时不需要且容易因网络慢而拖延就绪
+DEFAULT_BLOCK_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*hm.baidu.com*',
+    '*cnzz.com*',
+    '*fonts.googleapis.com*',
+    '*fonts.gstatic.com*',
+    '*use.typekit.net*',
+]
+
+# 多标签页模式下切换到下一个任务前重置页面状态
+RESET_TAB_JS = """
+try { localStorage.clear(); } catch (e) {}
+try { sessionStorage.clear(); } catch (e) {}
+"""
+
+# 就绪检测的轮询间隔（秒）
+READY_POLL_INTERVAL = 0.025
+
+# 固定等待策略下各阶段的等待时间（秒），与旧版本行为一致
+FIXED_WAITS = {'load': 3, 'scroll': 1, 'resize': 2, 'tile': 0.3}
+
+# 分块截图：页面高度超过 DEFAULT_MAX_CAPTURE_HEIGHT 时按 DEFAULT_TILE_HEIGHT 分块滚动截图，
+# 避免浏览器为整页分配超大的绘制缓冲区
+DEFAULT_TILE_HEIGHT = 2048
+DEFAULT_MAX_CAPTURE_HEIGHT = 8192
+
+# 浏览器回收：默认每处理 DEFAULT_RECYCLE_PAGES 个页面换一个新的浏览器，
+# 达到回收条件的 RECYCLE_PREWARM_RATIO 时在后台预先启动备用浏览器
+DEFAULT_RECYCLE_PAGES = 500
+RECYCLE_PREWARM_RATIO = 0.9
+
+# 输出格式及其扩展名，WEBP和AVIF需要Pillow支持（见 available_formats）
+FORMAT_EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp', 'AVIF': '.avif'}
+
+# 有损格式，quality 和 target_size 只对这些格式生效
+LOSSY_FORMATS = ('JPEG', 'WEBP', 'AVIF')
+
+# 各格式支持的最大边长
+FORMAT_MAX_DIMENSION = {'JPEG': 65500, 'WEBP': 16383}
+
+# 编码选项 encode_options 支持的键:
+# optimize: PNG/JPEG 额外压缩优化; compress_level: PNG压缩级别 0-9;
+# progressive: 渐进式JPEG; subsampling: JPEG色度抽样 ('4:4:4', '4:2:2', '4:2:0');
+# lossless: WEBP无损压缩; method: WEBP压缩方法 0-6（越大越慢、文件越小）;
+# target_size: 有损格式的目标文件大小（字节），自动二分查找不超过该大小的最高质量
+ENCODE_OPTIONS = ('optimize', 'compress_level', 'progressive', 'subsampling', 'lossless', 'method', 'target_size')
+
+# 常用的派生输出：1倍图、2倍图和宽度300像素的缩略图
+DEFAULT_VARIANTS = ['1x', '2x', '300w']
+
+# 分块截图时隐藏固定定位和粘性定位的元素，避免导航栏等在每一块中重复出现
+HIDE_FIXED_ELEMENTS_JS = """
+var hidden = window.__html2imgHidden = window.__html2imgHidden || [];
+var elements = document.body ? document.body.getElementsByTagName('*') : [];
+for (var i = 0; i < elements.length; i++) {
+    var position = window.getComputedStyle(elements[i]).position;
+    if ((position === 'fixed' || position === 'sticky') && elements[i].style.visibility !== 'hidden') {
+        hidden.push([elements[i], elements[i].style.visibility]);
+        elements[i].style.visibility = 'hidden';
+    }
+}
+"""
+
+RESTORE_FIXED_ELEMENTS_JS = """
+var hidden = window.__html2imgHidden || [];
+for (var i = 0; i < hidden.length; i++) {
+    hidden[i][0].style.visibility = hidden[i][1];
+}
+window.__html2imgHidden = [];
+"""
+
+def flatten_to_rgb(img):
+    """将带透明通道的图片合成到白色背景上，返回RGB图片"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # 创建白色背景
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode not in ('RGB', 'RGBX'):
+        return img.convert('RGB')
+    # RGBX可以直接编码为JPEG，无需复制整张图片
+    return img
+
+class TiledCanvas:
+    """
+    分块截图的拼接画布
+    
+    像素数据保存在内存映射的临时文件中，逐块写入，整页图片不会一次性占用内存；
+    编码时直接基于映射的数据创建图片，不复制像素
+    """
+    
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._row_bytes = width * 4
+        self._file = tempfile.TemporaryFile()
+        self._file.truncate(self._row_bytes * height)
+        self._buffer = mmap.mmap(self._file.fileno(), self._row_bytes * height)
+    
+    @property
+    def size(self):
+        return (self.width, self.height)
+    
+    def write_rows(self, tile, top):
+        """把一块截图（宽度与画布相同）写入从第 top 行开始的区域"""
+        # 截图本身不透明，合成到白色背景后以RGBX保存，第四个字节固定为255
+        data = flatten_to_rgb(tile).convert('RGBX').tobytes()
+        offset = top * self._row_bytes
+        self._buffer[offset:offset + len(data)] = data
+    
+    def fill_rows(self, top, color=(255, 255, 255)):
+        """把从第 top 行到末尾的区域填充为指定颜色（页面内容不足画布高度时使用）"""
+        row = bytes((*color, 255)) * self.width
+        for y in range(top, self.height):
+            offset = y * self._row_bytes
+            self._buffer[offset:offset + self._row_bytes] = row
+    
+    def as_image(self, mode='RGBA'):
+        """
+        基于映射数据创建图片（不复制像素）
+        
+        参数:
+        mode: 'RGBA'（用于PNG）或 'RGBX'（用于JPEG），两者共用同一份数据
+        """
+        return Image.frombuffer(mode, self.size, self._buffer, 'raw', mode, 0, 1)
+    
+    @property
+    def closed(self):
+        return self._file.closed
+    
+    def close(self):
+        """关闭内存映射和临时文件，可以重复调用"""
+        try:
+            self._buffer.close()
+        except BufferError:
+            # 仍有图片引用映射的数据（例如异常回溯中的局部变量），映射在引用释放后自动关闭
+            pass
+        self._file.close()
+
+def available_formats():
+    """当前Pillow支持的输出格式列表"""
+    Image.init()
+    return [image_format for image_format in FORMAT_EXTENSIONS
+            if image_format in ('PNG', 'JPEG') or image_format in Image.SAVE]
+
+def _save_options(image_format, quality, options):
+    """把编码选项转换为Pillow的保存参数"""
+    if image_format == 'PNG':
+        kwargs = {'optimize': bool(options.get('optimize'))}
+        if options.get('compress_level') is not None:
+            kwargs['compress_level'] = int(options['compress_level'])
+    elif image_format == 'JPEG':
+        kwargs = {'quality': quality, 'optimize': bool(options.get('optimize')),
+                  'progressive': bool(options.get('progressive'))}
+        if options.get('subsampling') is not None:
+            kwargs['subsampling'] = options['subsampling']
+    elif image_format == 'WEBP':
+        kwargs = {'quality': quality, 'lossless': bool(options.get('lossless')),
+                  'method': int(options.get('method', 4))}
+    else:
+        kwargs = {'quality': quality}
+    return kwargs
+
+def _encode_to_target_size(img, image_format, quality, options, target_size):
+    """
+    二分查找不超过目标大小的最高质量，返回编码后的数据
+    
+    以 quality 为上限；质量为1时仍超过目标大小则返回质量为1的结果
+    """
+    def encode(value):
+        buffer = io.BytesIO()
+        img.save(buffer, image_format, **_save_options(image_format, value, options))
+        return buffer.getvalue()
+    
+    data = encode(quality)
+    if len(data) <= target_size:
+        return data
+    
+    best = None
+    low, high = 1, quality - 1
+    while low <= high:
+        middle = (low + high) // 2
+        data = encode(middle)
+        if len(data) <= target_size:
+            best = data
+            low = middle + 1
+        else:
+            high = middle - 1
+    return best if best is not None else encode(1)
+
+def _encode_to(fp, source, image_format='PNG', quality=95, options=None):
+    """把截图（PNG数据、PIL图片或分块画布）按目标格式编码写入文件对象"""
+    image_format = image_format.upper()
+    options = options or {}
+    if isinstance(source, TiledCanvas):
+        img = source.as_image('RGBX' if image_format == 'JPEG' else 'RGBA')
+    elif isinstance(source, (bytes, bytearray)):
+        img = Image.open(io.BytesIO(source))
+    else:
+        img = source
+    
+    limit = FORMAT_MAX_DIMENSION.get(image_format)
+    if limit and max(img.size) > limit:
+        raise ValueError(f"{image_format}格式最大支持 {limit} 像素，当前图片为 "
+                         f"{img.size[0]}x{img.size[1]}，请改用PNG格式")
+    
+    if image_format == 'JPEG':
+        img = flatten_to_rgb(img)
+    elif image_format != 'PNG' and img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    
+    target_size = options.get('target_size')
+    if target_size and image_format in LOSSY_FORMATS and not options.get('lossless'):
+        fp.write(_encode_to_target_size(img, image_format, quality, options, int(target_size)))
+    else:
+        img.save(fp, image_format, **_save_options(image_format, quality, options))
+
+def encode_image(png_data, image_format='PNG', quality=95, options=None):
+    """
+    将截图得到的PNG数据编码为目标格式，全程在内存中完成
+    
+    参数:
+    png_data: PNG图片数据（分块截图时为 TiledCanvas）
+    image_format: 目标格式 ('PNG'、'JPEG'、'WEBP' 或 'AVIF')
+    quality: 有损格式的质量 (1-100)
+    options: 编码选项字典，支持的键见 ENCODE_OPTIONS
+    
+    返回编码后的图片数据；传入的分块画布在编码结束后关闭
+    """
+    if (image_format.upper() == 'PNG' and isinstance(png_data, (bytes, bytearray))
+            and not (options and (options.get('optimize') or options.get('compress_level') is not None))):
+        # 截图本身就是PNG，无需重新编码
+        return png_data
+    
+    buffer = io.BytesIO()
+    try:
+        _encode_to(buffer, png_data, image_format, quality, options)
+    finally:
+        if isinstance(png_data, TiledCanvas):
+            png_data.close()
+    return buffer.getvalue()
+
+def save_image_bytes(output_path, image_data):
+    """
+    将图片数据写入文件，必要时创建输出目录
+    
+    先写入临时文件再替换目标文件，避免覆盖与渲染缓存硬链接的同一份数据
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(image_data)
+        os.replace(temp_path, output_path)
+    finally:
+        # 写入或替换失败时不留下临时文件
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def normalize_output_path(output_path, image_format='PNG'):
+    """PNG、WEBP、AVIF输出缺少对应扩展名时补充扩展名"""
+    image_format = image_format.upper()
+    if image_format == 'JPEG':
+        return output_path
+    extension = FORMAT_EXTENSIONS.get(image_format, '.png')
+    if not output_path.lower().endswith(extension):
+        output_path += extension
+    return output_path
+
+def path_to_file_url(path):
+    """本地路径转为 file:// 地址，目录地址以 / 结尾以便解析相对路径"""
+    url = f"file:///{os.path.abspath(path).replace(os.sep, '/')}"
+    if os.path.isdir(path) and not url.endswith('/'):
+        url += '/'
+    return url
+
+def inject_base_href(html, base_url):
+    """在HTML文档的 <head> 中插入 <base> 标签，使相对路径的资源按 base_url 解析"""
+    base_tag = f'<base href="{html_lib.escape(base_url, quote=True)}">'
+    match = re.search(r'<head\b[^>]*>', html, re.IGNORECASE)
+    if match:
+        return html[:match.end()] + base_tag + html[match.end():]
+    return base_tag + html
+
+def parse_variant(spec):
+    """
+    解析派生输出的描述，返回 {'name': 文件名后缀, 'scale': 倍数} 或 {'name': 文件名后缀, 'width': 宽度}
+    
+    spec 可以是 '2x'（相对页面CSS像素的倍数，文件名后缀 @2x）、'300w'（固定宽度，后缀 _300w），
+    也可以用 '后缀=描述' 指定后缀（例如 '_thumb=300w'），或直接传入上述格式的字典
+    """
+    if isinstance(spec, dict):
+        variant = dict(spec)
+    else:
+        name, _, value = spec.strip().rpartition('=')
+        value = value.strip().lower()
+        try:
+            if value.endswith('x'):
+                variant = {'name': name or f"@{value}", 'scale': float(value[:-1])}
+            elif value.endswith('w'):
+                variant = {'name': name or f"_{value}", 'width': int(value[:-1])}
+            else:
+                raise ValueError(value)
+        except ValueError:
+            raise ValueError(f"无效的派生输出描述: {spec}（例如 1x、2x、300w、_thumb=300w）")
+    
+    if not variant.get('name') or (variant.get('scale') or variant.get('width') or 0) <= 0:
+        raise ValueError(f"无效的派生输出描述: {spec}")
+    return variant
+
+def variant_output_path(output_path, name):
+    """在输出文件名的扩展名前加上派生输出的后缀"""
+    root, extension = os.path.splitext(output_path)
+    return f"{root}{name}{extension}"
+
+def resize_for_variant(img, variant, device_scale_factor=1):
+    """
+    按派生输出的要求缩放截图，使用LANCZOS重采样
+    
+    参数:
+    img: 以 device_scale_factor 倍截取的图片
+    variant: parse_variant 的返回值
+    device_scale_factor: 截图时的设备像素比
+    """
+    if 'width' in variant:
+        width = int(variant['width'])
+    else:
+        width = int(round(img.width * variant['scale'] / device_scale_factor))
+    if width == img.width:
+        return img
+    height = max(1, int(round(img.height * width / img.width)))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    return img.resize((max(1, width), height), Image.LANCZOS)
+
+def encode_and_save(png_data, output_path, image_format='PNG', quality=95, timings=None, options=None,
+                    variants=None, device_scale_factor=1):
+    """
+    编码截图并保存到文件，返回实际保存的路径
+    
+    该函数位于模块顶层，可以直接提交给进程池执行；
+    分块截图（TiledCanvas）直接编码写入文件，不在内存中保留整张编码后的图片，保存结束后关闭画布
+    
+    参数:
+    timings: 传入字典时记录 'encode' 和 'write' 两个阶段的耗时（秒）；
+             分块截图边编码边写入，全部计入 'encode'
+    options: 编码选项字典，支持的键见 ENCODE_OPTIONS
+    variants: 派生输出列表（parse_variant 的返回值），设置后同一张截图缩放后分别保存到
+              带后缀的文件中，返回第一个派生输出的路径
+    device_scale_factor: 截图时的设备像素比，用于计算派生输出的缩放比例
+    """
+    try:
+        return _encode_and_save(png_data, output_path, image_format, quality, timings, options, variants,
+                                device_scale_factor)
+    finally:
+        if isinstance(png_data, TiledCanvas):
+            png_data.close()
+
+def _encode_and_save(png_data, output_path, image_format='PNG', quality=95, timings=None, options=None,
+                     variants=None, device_scale_factor=1):
+    """encode_and_save 的实现，派生输出共用同一块画布，不在这里关闭"""
+    if timings is None:
+        timings = {}
+    output_path = normalize_output_path(output_path, image_format)
+    
+    if variants:
+        if isinstance(png_data, TiledCanvas):
+            img = png_data.as_image('RGBA')
+        elif isinstance(png_data, (bytes, bytearray)):
+            img = Image.open(io.BytesIO(png_data))
+            img.load()
+        else:
+            img = png_data
+        
+        saved_paths = []
+        for variant in variants:
+            start = time.perf_counter()
+            resized = resize_for_variant(img, variant, device_scale_factor)
+            timings['resample'] = timings.get('resample', 0.0) + time.perf_counter() - start
+            
+            # 无需缩放时直接使用原始数据，PNG截图可以原样写入
+            source = png_data if resized is img else resized
+            variant_timings = {}
+            saved_paths.append(_encode_and_save(source, variant_output_path(output_path, variant['name']),
+                                                image_format, quality, variant_timings, options))
+            for stage, seconds in variant_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        return saved_paths[0]
+    
+    if isinstance(png_data, (bytes, bytearray)):
+        start = time.perf_counter()
+        image_data = encode_image(png_data, image_format, quality, options)
+        encoded = time.perf_counter()
+        save_image_bytes(output_path, image_data)
+        timings['encode'] = encoded - start
+        timings['write'] = time.perf_counter() - encoded
+        return output_path
+    
+    start = time.perf_counter()
+    
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            _encode_to(f, png_data, image_format, quality, options)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    timings['encode'] = time.perf_counter() - start
+    return output_path
+
+def encode_and_save_timed(png_data, output_path, image_format='PNG', quality=95, options=None, variants=None,
+                          device_scale_factor=1):
+    """在编码进程中执行 encode_and_save，返回 (保存路径, 各阶段耗时)"""
+    timings = {}
+    output_path = encode_and_save(png_data, output_path, image_format, quality, timings, options, variants,
+                                  device_scale_factor)
+    return output_path, timings
+
+def collect_local_assets(html_file_path):
+    """
+    收集HTML文件引用的本地资源（CSS/JS/图片等），CSS中引用的资源会继续递归收集
+    
+    返回存在的本地文件绝对路径集合，远程地址和内联数据会被忽略
+    """
+    assets = set()
+    pending = [os.path.abspath(html_file_path)]
+    visited = set()
+    
+    while pending:
+        path = pending.pop()
+        if path in visited:
+            continue
+        visited.add(path)
+        
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+        except OSError:
+            continue
+        
+        base_dir = os.path.dirname(path)
+        for match in ASSET_REFERENCE_PATTERN.finditer(content):
+            attribute, attribute_value, css_url, css_import = match.groups()
+            reference = (attribute_value or css_url or css_import).strip()
+            if re.match(r'^(?:[a-z][a-z0-9+.-]*:|//|#)', reference, re.IGNORECASE) and \
+                    not reference.lower().startswith('file:'):
+                continue
+            reference = re.sub(r'^file:/*', '/', reference, flags=re.IGNORECASE)
+            reference = urllib.parse.unquote(reference.split('#')[0].split('?')[0])
+            if not reference:
+                continue
+            
+            # 超链接指向的其他页面不影响当前页面的渲染结果
+            if attribute and attribute.lower() == 'href' and reference.lower().endswith(('.html', '.htm')):
+                continue
+            
+            asset_path = os.path.abspath(os.path.join(base_dir, reference))
+            if not os.path.isfile(asset_path) or asset_path == os.path.abspath(html_file_path):
+                continue
+            assets.add(asset_path)
+            if asset_path.lower().endswith('.css'):
+                pending.append(asset_path)
+    
+    return assets
+
+class RenderCache:
+    """
+    按内容寻址的渲染结果缓存
+    
+    缓存键由HTML文件内容、其引用的本地资源内容以及渲染参数（尺寸、格式、质量）共同计算，
+    命中时直接硬链接（或复制）缓存的图片，无需启动渲染；缓存总大小超出上限时按最近使用时间淘汰。
+    """
+    
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        """
+        参数:
+        cache_dir: 缓存目录
+        max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._file_digests = {}
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+    
+    def _file_digest(self, path):
+        """计算文件内容摘要，按修改时间和大小缓存结果，避免重复读取共享的CSS和图片"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._file_digests.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self._file_digests[path] = (signature, digest)
+        return digest
+    
+    def make_key(self, html_file_path, params):
+        """计算缓存键：HTML内容 + 本地资源内容 + 渲染参数"""
+        html_file_path = os.path.abspath(html_file_path)
+        base_dir = os.path.dirname(html_file_path)
+        
+        key = hashlib.sha256()
+        key.update(json.dumps(dict(params, version=RENDER_CACHE_VERSION), sort_keys=True).encode('utf-8'))
+        key.update(self._file_digest(html_file_path).encode('ascii'))
+        for asset in sorted(collect_local_assets(html_file_path)):
+            key.update(os.path.relpath(asset, base_dir).replace(os.sep, '/').encode('utf-8'))
+            key.update(self._file_digest(asset).encode('ascii'))
+        return key.hexdigest()
+    
+    def _entry_path(self, key, output_path):
+        return os.path.join(self.cache_dir, key + os.path.splitext(output_path)[1].lower())
+    
+    def fetch(self, key, output_path):
+        """缓存命中时把缓存图片放到输出路径并返回True，否则返回False"""
+        entry = self._entry_path(key, output_path)
+        if not os.path.exists(entry):
+            with self._lock:
+                self.misses += 1
+            return False
+        
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(entry, temp_path)
+        except OSError:
+            # 跨磁盘或文件系统不支持硬链接时改为复制
+            shutil.copyfile(entry, temp_path)
+        os.replace(temp_path, output_path)
+        
+        # 更新修改时间，作为最近使用时间参与淘汰
+        os.utime(entry)
+        with self._lock:
+            self.hits += 1
+        return True
+    
+    def store(self, key, output_path):
+        """把新渲染的图片加入缓存，必要时淘汰最久未使用的条目"""
+        entry = self._entry_path(key, output_path)
+        if os.path.exists(entry):
+            return
+        
+        temp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(output_path, temp_path)
+        except OSError:
+            shutil.copyfile(output_path, temp_path)
+        os.replace(temp_path, entry)
+        
+        with self._lock:
+            self._total_bytes += os.path.getsize(entry)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        """按最近使用时间从旧到新删除缓存，直到总大小回到上限的90%以内"""
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+    
+    def summary(self):
+        """返回缓存统计信息"""
+        return f"命中 {self.hits} 次，未命中 {self.misses} 次，占用 {self._total_bytes / (1024 * 1024):.1f} MB"
+
+class BatchManifest:
+    """
+    增量转换清单，保存在输出目录中
+    
+    记录每个源文件的修改时间、大小、内容摘要、引用的本地资源状态以及渲染参数，
+    下次转换时只有输入或参数发生变化的文件才需要重新生成（类似 make）。
+    """
+    
+    FILE_NAME = '.html2img_manifest.json'
+    
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self.entries = {}
+        self._lock = threading.Lock()
+        
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            self.entries = {}
+    
+    @staticmethod
+    def _stat_signature(path):
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    
+    @staticmethod
+    def _file_sha256(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def is_up_to_date(self, html_file, output_files, params):
+        """
+        判断源文件、引用资源和渲染参数自上次生成后是否都没有变化
+        
+        output_files 为输出文件路径（有派生输出时为路径列表），任一输出文件缺失都需要重新生成
+        """
+        source = os.path.abspath(html_file)
+        with self._lock:
+            entry = self.entries.get(source)
+        if isinstance(output_files, str):
+            output_files = [output_files]
+        if not entry or entry.get('params') != params or not all(os.path.exists(path) for path in output_files):
+            return False
+        
+        try:
+            signature = self._stat_signature(source)
+            if signature != entry['source']:
+                # 修改时间变化但内容相同（例如重新检出），更新记录后仍视为未变化
+                if signature[1] != entry['source'][1] or self._file_sha256(source) != entry['sha256']:
+                    return False
+                with self._lock:
+                    entry['source'] = signature
+            
+            for asset, asset_signature in entry.get('assets', {}).items():
+                if self._stat_signature(asset) != asset_signature:
+                    return False
+        except OSError:
+            return False
+        return True
+    
+    def record(self, html_file, output_files, params):
+        """记录一次成功的转换，output_files 为输出文件路径或路径列表"""
+        source = os.path.abspath(html_file)
+        try:
+            entry = {
+                'source': self._stat_signature(source),
+                'sha256': self._file_sha256(source),
+                'assets': {asset: self._stat_signature(asset) for asset in collect_local_assets(source)},
+                'params': params,
+                'output': ([os.path.abspath(path) for path in output_files]
+                           if isinstance(output_files, (list, tuple)) else os.path.abspath(output_files))
+            }
+        except OSError:
+            return
+        with self._lock:
+            self.entries[source] = entry
+    
+    def save(self):
+        """写入清单文件"""
+        with self._lock:
+            data = json.dumps({'version': 1, 'files': self.entries}, ensure_ascii=False, indent=1)
+        save_image_bytes(self.path, data.encode('utf-8'))
+
+class BatchJournal:
+    """
+    批量转换日志，保存在输出目录中
+    
+    每完成一个文件立即追加一行JSON并刷新到磁盘，转换中途被中断（程序崩溃、强制结束）后，
+    使用 resume 重新运行时跳过日志中已经成功、且源文件没有修改过的文件，从中断的位置继续。
+    第一行记录渲染参数，参数变化后旧的日志不再有效；不使用 resume 重新运行时，参数相同的未完成日志
+    继续保留并追加记录。批量转换正常结束后删除日志，之后的 resume 不再跳过任何文件。
+    """
+    
+    FILE_NAME = '.html2img_journal.jsonl'
+    
+    def __init__(self, output_dir, params, resume=False):
+        """
+        参数:
+        output_dir: 输出目录
+        params: 本次转换的渲染参数
+        resume: 是否从已有的日志继续，否则重新开始记录
+        """
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        # 已成功的文件及其转换时的源文件签名 (修改时间, 大小)
+        self.completed = {}
+        self._partial_line = False
+        self._lock = threading.Lock()
+        
+        # 输出目录中有参数相同、上次中断的日志：不使用 resume 时也不能清空，以免丢失断点
+        self.interrupted = self._load(params)
+        if not resume:
+            self.completed.clear()
+        os.makedirs(output_dir, exist_ok=True)
+        # 行缓冲：每条记录写完整行后立即写入文件
+        self._file = open(self.path, 'a' if self.interrupted else 'w', encoding='utf-8', buffering=1)
+        if not self.interrupted:
+            self._write({'params': params, 'started': time.time()})
+        elif self._partial_line:
+            # 中断时留下的不完整行单独成行，新记录从下一行开始
+            self._file.write('\n')
+    
+    def _load(self, params):
+        """读取已有日志中成功完成的文件，参数不一致、日志不存在或上次转换已经正常结束时返回False"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except OSError:
+            return False
+        lines = content.splitlines()
+        self._partial_line = bool(content) and not content.endswith('\n')
+        
+        try:
+            if not lines or json.loads(lines[0]).get('params') != params:
+                return False
+        except ValueError:
+            return False
+        
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 中断时可能留下不完整的最后一行
+                continue
+            if entry.get('complete'):
+                self.completed.clear()
+                return False
+            if entry.get('ok'):
+                self.completed[entry['file']] = entry.get('source')
+        return True
+    
+    @staticmethod
+    def source_signature(html_file):
+        """源文件签名 [修改时间, 大小]，文件不存在时返回None"""
+        try:
+            stat = os.stat(html_file)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+    
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    
+    def is_done(self, html_file, output_files):
+        """文件在之前的运行中已经成功转换、之后源文件没有修改过，且输出文件仍然存在"""
+        source = self.completed.get(os.path.abspath(html_file))
+        return (source is not None
+                and source == self.source_signature(html_file)
+                and all(os.path.exists(path) for path in output_files))
+    
+    def record(self, html_file, output_file, ok):
+        """记录一个文件的转换结果"""
+        self._write({'file': os.path.abspath(html_file), 'output': output_file, 'ok': ok,
+                     'source': self.source_signature(html_file), 'time': time.time()})
+    
+    def close(self, complete=False):
+        """
+        参数:
+        complete: 批量转换已经正常结束，删除日志
+        """
+        with self._lock:
+            self._file.close()
+        if complete:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+class BatchProgress:
+    """批量转换的线程安全进度计数器"""
+    
+    def __init__(self, total, progress_callback=None, log=None):
+        self.total = total
+        self.done = 0
+        self.success = 0
+        self.progress_callback = progress_callback
+        self.log = log
+        self.listeners = []
+        self._lock = threading.Lock()
+    
+    def finish(self, ok, html_file=None, output_file=None):
+        """记录一个文件处理完成，通知监听者并更新进度回调"""
+        if html_file is not None:
+            for listener in self.listeners:
+                listener(html_file, output_file, ok)
+        
+        with self._lock:
+            self.done += 1
+            if ok:
+                self.success += 1
+            if self.log:
+                self.log(f"📋 进度: {self.done}/{self.total}")
+            if self.progress_callback:
+                self.progress_callback(self.done)
+
+class PerformanceReport:
+    """
+    转换性能统计：线程安全地记录每个页面各阶段的耗时、页面数量和写入的字节数，
+    汇总为各阶段的 p50/p95/最大值以及吞吐量，可导出为JSON或CSV
+    """
+    
+    # 报告中各阶段的显示顺序，未列出的阶段排在后面
+    # page 为单个页面从开始加载到保存完成（使用编码进程池时为提交编码）的总耗时
+    STAGES = ('driver_setup', 'navigation', 'wait', 'height_probe', 'resize', 'screenshot', 'daemon_render',
+              'resample', 'encode', 'write', 'page')
+    
+    def __init__(self):
+        self.samples = {}
+        self.pages = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.events = {}
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+    
+    def add(self, stage, seconds):
+        """记录一次阶段耗时"""
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+    
+    def add_page(self, ok):
+        """记录一个页面处理完成"""
+        with self._lock:
+            self.pages += 1
+            if not ok:
+                self.failed += 1
+    
+    def count(self, event):
+        """记录一次事件（如 'retry' 重试、'driver_restart' 浏览器重启）"""
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + 1
+    
+    def record_output(self, output_paths, timings):
+        """记录一个页面的编码、写入耗时和输出文件（一个路径或派生输出的路径列表）的大小"""
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+        if isinstance(output_paths, str):
+            output_paths = [output_paths]
+        size = 0
+        for path in output_paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        with self._lock:
+            self.bytes_written += size
+    
+    def merge(self, other):
+        """合并另一份统计中的阶段耗时（例如浏览器池中新建浏览器的启动时间）"""
+        with other._lock:
+            samples = {stage: list(values) for stage, values in other.samples.items()}
+        for stage, values in samples.items():
+            for seconds in values:
+                self.add(stage, seconds)
+    
+    def stop(self):
+        """结束计时"""
+        self.finished = time.perf_counter()
+    
+    def next_batch(self):
+        """
+        为下一次批量转换创建新的统计
+        
+        批量转换开始前启动浏览器的耗时（创建转换器、更换设备像素比时重新启动等）尚未计入任何报告，
+        转入新的统计；已经结束的统计中的样本不再重复计入
+        """
+        report = PerformanceReport()
+        if self.finished is None:
+            with self._lock:
+                report.samples['driver_setup'] = list(self.samples.get('driver_setup', []))
+                report.events = dict(self.events)
+        return report
+    
+    @staticmethod
+    def percentile(values, percent):
+        """最近秩法计算百分位数，values 必须已排序"""
+        if not values:
+            return 0.0
+        rank = max(1, int(-(-percent * len(values) // 100)))
+        return values[min(rank, len(values)) - 1]
+    
+    def summary(self):
+        """返回汇总结果字典"""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+            pages, failed, bytes_written = self.pages, self.failed, self.bytes_written
+            events = dict(self.events)
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        
+        order = {stage: index for index, stage in enumerate(self.STAGES)}
+        stages = {}
+        for stage in sorted(samples, key=lambda name: (order.get(name, len(order)), name)):
+            values = samples[stage]
+            stages[stage] = {
+                'count': len(values),
+                'total': round(sum(values), 4),
+                'p50': round(self.percentile(values, 50), 4),
+                'p95': round(self.percentile(values, 95), 4),
+                'max': round(values[-1], 4)
+            }
+        return {
+            'pages': pages,
+            'failed': failed,
+            'elapsed': round(elapsed, 3),
+            'pages_per_second': round(pages / elapsed, 3) if elapsed > 0 else 0.0,
+            'bytes_written': bytes_written,
+            'events': events,
+            'stages': stages
+        }
+    
+    def format_lines(self):
+        """生成用于日志输出的报告文本行"""
+        summary = self.summary()
+        lines = [
+            f"📊 性能报告: {summary['pages']} 个页面，用时 {summary['elapsed']:.2f}秒，"
+            f"{summary['pages_per_second']:.2f} 页/秒，写入 {summary['bytes_written'] / 1024 / 1024:.2f}MB",
+            f"   {'阶段':<14}{'次数':>6}{'p50(秒)':>10}{'p95(秒)':>10}{'最大(秒)':>10}"
+        ]
+        for stage, stats in summary['stages'].items():
+            lines.append(f"   {stage:<14}{stats['count']:>6}{stats['p50']:>10.3f}{stats['p95']:>10.3f}"
+                         f"{stats['max']:>10.3f}")
+        if summary['events']:
+            lines.append("   事件: " + "，".join(f"{event} {count} 次" for event, count in summary['events'].items()))
+        return lines
+    
+    def export(self, path):
+        """导出报告，扩展名为 .csv 时导出各阶段的CSV表格，否则导出JSON"""
+        summary = self.summary()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'count', 'total', 'p50', 'p95', 'max'])
+                for stage, stats in summary['stages'].items():
+                    writer.writerow([stage, stats['count'], stats['total'], stats['p50'], stats['p95'], stats['max']])
+                writer.writerow([])
+                for key in ('pages', 'failed', 'elapsed', 'pages_per_second', 'bytes_written'):
+                    writer.writerow([key, summary[key]])
+                for event, count in summary['events'].items():
+                    writer.writerow([f"event:{event}", count])
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+class EncodePipeline:
+    """
+    图片编码流水线：把PNG截图的编码和保存交给进程池执行，
+    浏览器线程提交后即可继续渲染下一页
+    
+    进程池的回调线程只负责把完成的结果放入队列，写入渲染缓存、更新进度和增量清单等
+    都由提交截图的批量转换线程在下次提交或关闭流水线时处理
+    """
+    
+    def __init__(self, processes, log, max_pending=None):
+        """
+        参数:
+        processes: 编码进程数
+        log: 日志函数
+        max_pending: 最多允许多少张截图等待编码，超过时渲染线程阻塞等待，避免占用过多内存
+        """
+        self.executor = ProcessPoolExecutor(max_workers=processes)
+        self.log = log
+        self._slots = threading.BoundedSemaphore(max_pending or processes * 2)
+        self._results = queue.Queue()
+        log(f"🧮 启用编码进程池，进程数: {processes}")
+    
+    def submit(self, png_data, output_path, image_format, quality, on_done, options=None, variants=None,
+               device_scale_factor=1):
+        """
+        提交一张截图进行编码保存（参数同 encode_and_save），
+        完成后由批量转换线程调用 on_done(是否成功, 各阶段耗时)
+        """
+        self.drain()
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(encode_and_save_timed, png_data, output_path, image_format, quality,
+                                          options, variants, device_scale_factor)
+        except Exception:
+            self._slots.release()
+            raise
+        
+        def done(future):
+            self._slots.release()
+            self._results.put((future, output_path, on_done))
+        
+        future.add_done_callback(done)
+    
+    def drain(self):
+        """在当前（批量转换）线程中处理已经完成的编码结果"""
+        while True:
+            try:
+                future, output_path, on_done = self._results.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                saved_path, timings = future.result()
+                self.log(f"✅ 转换完成: {os.path.basename(saved_path)}")
+                ok = True
+            except Exception as e:
+                self.log(f"❌ 编码保存失败 {os.path.basename(output_path)}: {e}")
+                ok = False
+                timings = {}
+            try:
+                on_done(ok, timings)
+            except Exception as e:
+                self.log(f"⚠️  处理编码结果失败 {os.path.basename(output_path)}: {e}")
+    
+    def shutdown(self):
+        """等待所有待编码的图片完成后关闭进程池，并处理剩余的编码结果"""
+        self.executor.shutdown(wait=True)
+        self.drain()
+
+class AssetServer:
+    """
+    本地资源服务
+    
+    通过 http://127.0.0.1 的随机端口提供HTML文件及其引用的本地CSS/JS/图片，
+    读取过的文件保存在进程内存中，多个页面重复引用的资源不再反复读盘；
+    响应带有 ETag 并要求浏览器每次重新验证，文件未变化时返回304，浏览器直接复用自身缓存，
+    文件修改后下一次渲染立即使用新内容。地址中带有随机令牌，
+    本机其他程序无法借此读取文件。
+    """
+    
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        参数:
+        max_bytes: 内存缓存的大小上限（字节），超出时淘汰最久未使用的文件
+        """
+        self.max_bytes = max_bytes
+        self.token = secrets.token_hex(8)
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._memo_bytes = 0
+        self._lock = threading.Lock()
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{self.token}"
+    
+    def url_for(self, path):
+        """本地文件路径对应的资源服务地址"""
+        path = os.path.abspath(path).replace(os.sep, '/')
+        if not path.startswith('/'):
+            # Windows盘符路径，例如 C:/site/index.html
+            path = '/' + path
+        return self.base_url + urllib.parse.quote(path)
+    
+    def _local_path(self, url_path):
+        """把请求路径还原为本地文件路径，令牌不匹配时返回None"""
+        prefix = f"/{self.token}/"
+        url_path = url_path.split('?')[0].split('#')[0]
+        if not url_path.startswith(prefix):
+            return None
+        path = urllib.parse.unquote(url_path[len(prefix) - 1:])
+        if re.match(r'^/[a-zA-Z]:/', path):
+            path = path[1:]
+        return os.path.normpath(path)
+    
+    @staticmethod
+    def etag(signature):
+        """文件签名 (修改时间, 大小) 对应的ETag"""
+        return '"%x-%x"' % signature
+    
+    def signature(self, path):
+        """返回文件签名 (修改时间, 大小)，文件不存在时返回None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def read(self, path, signature=None):
+        """读取文件内容，优先使用内存中的副本；文件不存在时返回None"""
+        signature = signature or self.signature(path)
+        if signature is None:
+            return None
+        
+        with self._lock:
+            cached = self._memo.get(path)
+            if cached and cached[0] == signature:
+                self._memo.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        
+        with open(path, 'rb') as f:
+            data = f.read()
+        
+        with self._lock:
+            old = self._memo.pop(path, None)
+            if old:
+                self._memo_bytes -= len(old[1])
+            if len(data) <= self.max_bytes:
+                self._memo[path] = (signature, data)
+                self._memo_bytes += len(data)
+                while self._memo_bytes > self.max_bytes:
+                    _, (_, evicted) = self._memo.popitem(last=False)
+                    self._memo_bytes -= len(evicted)
+        return data
+    
+    def _make_handler(self):
+        asset_server = self
+        
+        class AssetRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = asset_server._local_path(self.path)
+                signature = asset_server.signature(path) if path else None
+                if signature is None:
+                    self.send_error(404)
+                    return
+                
+                # 浏览器每次都要重新验证，文件未变化时返回304，不再传输内容
+                etag = asset_server.etag(signature)
+                if etag in (self.headers.get('If-None-Match') or ''):
+                    with asset_server._lock:
+                        asset_server.hits += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', 'no-cache')
+                    self.end_headers()
+                    return
+                
+                data = asset_server.read(path, signature)
+                if data is None:
+                    self.send_error(404)
+                    return
+                content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', self.date_time_string(signature[0] // 1_000_000_000))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return AssetRequestHandler
+    
+    def summary(self):
+        """返回内存缓存统计信息"""
+        return f"命中 {self.hits} 次，读盘 {self.misses} 次，占用 {self._memo_bytes / (1024 * 1024):.1f} MB"
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class RenderDaemonError(RuntimeError):
+    """守护进程返回了错误响应，status 为HTTP状态码"""
+    
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+class RenderDaemonClient:
+    """渲染守护进程客户端，通过本机HTTP接口使用守护进程中常驻的浏览器"""
+    
+    def __init__(self, address=None, timeout=300):
+        """
+        参数:
+        address: 守护进程地址 (host:port)，默认读取环境变量 HTML2IMG_DAEMON
+        timeout: 单次渲染请求的超时时间（秒）
+        """
+        self.address = address or os.environ.get('HTML2IMG_DAEMON') or DEFAULT_DAEMON_ADDRESS
+        self.timeout = timeout
+        self.token = os.environ.get('HTML2IMG_DAEMON_TOKEN') or self._read_token()
+    
+    def _read_token(self):
+        try:
+            with open(daemon_token_path(self.address), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+    
+    @property
+    def base_url(self):
+        return f"http://{self.address}"
+    
+    @staticmethod
+    def is_disabled():
+        """环境变量 HTML2IMG_DAEMON 设为 off/0/no 时不连接守护进程"""
+        return os.environ.get('HTML2IMG_DAEMON', '').lower() in ('off', '0', 'no')
+    
+    def is_available(self, timeout=0.3):
+        """检查守护进程是否正在运行"""
+        if not self.token:
+            return False
+        request = urllib.request.Request(f"{self.base_url}/health", headers={DAEMON_TOKEN_HEADER: self.token})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read().decode('utf-8')).get('status') == 'ok'
+        except Exception:
+            return False
+    
+    def render_png(self, html_file_path, width, height, **options):
+        """请求守护进程渲染HTML文件，返回PNG图片数据"""
+        payload = dict(options, html_file=os.path.abspath(html_file_path), width=width, height=height)
+        return self._post('/render', payload)
+    
+    def render_png_from_string(self, html, width, height, base_url=None, **options):
+        """请求守护进程渲染HTML文档内容，返回PNG图片数据"""
+        payload = dict(options, html=html, base_url=base_url, width=width, height=height)
+        return self._post('/render', payload)
+    
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', DAEMON_TOKEN_HEADER: self.token},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            except Exception:
+                message = str(e)
+            raise RenderDaemonError(f"守护进程渲染失败: {message}", e.code)
+
+class ConversionCancelled(Exception):
+    """转换被取消（取消令牌已设置），正在处理的页面在下一个阶段开始前中止"""
 
 class HTMLToImageConverter:
-    def __init__(self, log_callback=None):
-        """初始化转换器"""
+    def __init__(self, log_callback=None, name=None, wait_strategy='smart', ready_timeout=10.0, quiet_period=0.1,
+                 use_daemon=True, cache_dir=None, cache_max_mb=1024, intercept_assets=False, block_patterns=None,
+                 tile_height=DEFAULT_TILE_HEIGHT, max_capture_height=DEFAULT_MAX_CAPTURE_HEIGHT, encode_options=None,
+                 device_scale_factor=None, variants=None, page_timeout=120, max_retries=2, retry_backoff=1.0,
+                 recycle_pages=DEFAULT_RECYCLE_PAGES, recycle_rss_mb=0, recycle_minutes=0):
+        """
+        初始化转换器
+        
+        参数:
+        log_callback: 日志回调函数
+        name: 转换器名称，并行模式下作为日志前缀区分各个工作浏览器
+        wait_strategy: 页面等待策略 ('smart' 就绪检测 或 'fixed' 固定等待)
+        ready_timeout: 就绪检测的最长等待时间（秒）
+        quiet_period: 网络和DOM保持静默多久视为就绪（秒）
+        use_daemon: 渲染守护进程正在运行时直接使用其常驻浏览器，不再启动本地浏览器
+        cache_dir: 渲染缓存目录，设置后相同内容和参数的页面直接复用已有图片
+        cache_max_mb: 渲染缓存的大小上限（MB）
+        intercept_assets: 通过本地资源服务加载页面，重复引用的本地资源直接从内存提供，
+                          并默认拦截 DEFAULT_BLOCK_PATTERNS 中的统计分析和远程字体请求
+        block_patterns: 需要拦截的请求地址通配符列表（如 '*fonts.googleapis.com*'），
+                        设置后覆盖默认的拦截列表
+        tile_height: 分块截图时每一块的高度
+        max_capture_height: 页面高度超过该值时改为分块截图，内存占用只与分块大小有关
+        encode_options: 图片编码选项字典（PNG压缩、渐进式JPEG、目标文件大小等），支持的键见 ENCODE_OPTIONS
+        device_scale_factor: 浏览器的设备像素比，截图尺寸为页面CSS像素的相应倍数；
+                             默认取派生输出中的最大倍数（没有派生输出时为1）
+        variants: 派生输出列表（如 DEFAULT_VARIANTS 或 ['1x', '2x', '300w']，格式见 parse_variant），
+                  每个页面只渲染一次，按最高倍数截图后缩放出各个版本
+        page_timeout: 单个页面的最长处理时间（秒），超时视为浏览器卡死，强制结束并重新启动浏览器；0 表示不限制
+        max_retries: 批量转换中页面渲染失败后的最多重试次数
+        retry_backoff: 第一次重试前的等待时间（秒），之后每次重试等待时间加倍
+        recycle_pages: 浏览器处理这么多个页面后回收（换成新的浏览器），释放长时间运行积累的内存；0 表示不限制
+        recycle_rss_mb: 浏览器（包括所有子进程）的内存占用超过该值（MB）时回收，需要安装 psutil；0 表示不限制
+        recycle_minutes: 浏览器运行超过该时间（分钟）后回收；0 表示不限制
+        """
         self.driver = None
         self.log_callback = log_callback
+        self.name = name
+        self.wait_strategy = wait_strategy
+        self.ready_timeout = ready_timeout
+        self.quiet_period = quiet_period
+        self.tile_height = tile_height
+        self.max_capture_height = max_capture_height
+        self.encode_options = self.check_encode_options(encode_options)
+        self.variants = [parse_variant(variant) for variant in variants or []]
+        self.device_scale_factor = device_scale_factor or self.required_scale_factor()
+        # 创建时指定的设备像素比（未指定时为1），不再需要派生输出时恢复为该值
+        self._base_scale_factor = device_scale_factor or 1
+        self.page_timeout = page_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.recycle_pages = recycle_pages
+        self.recycle_rss_mb = recycle_rss_mb
+        self.recycle_minutes = recycle_minutes
+        # 当前浏览器处理的页面数和启动时间，以及后台预先启动的备用浏览器
+        self._driver_pages = 0
+        self._driver_started = time.monotonic()
+        # 最近一次检测的浏览器内存占用：((启动时间, 已处理页面数), 字节数)，每处理一个页面只检测一次
+        self._rss_sample = None
+        self._spare = None
+        # 取消令牌：设置后各阶段之间检查并抛出 ConversionCancelled，批量转换不再开始新的页面
+        self.cancel_event = threading.Event()
+        self.stats = PerformanceReport()
+        self.last_report = None
+        self.supports_cdp = False
+        self.use_daemon = use_daemon
+        self.daemon = None
+        self.cache = RenderCache(cache_dir, cache_max_mb * 1024 * 1024) if cache_dir else None
+        self.intercept_assets = intercept_assets
+        if block_patterns is None and intercept_assets:
+            block_patterns = DEFAULT_BLOCK_PATTERNS
+        self.block_patterns = list(block_patterns or [])
+        self.asset_server = None
+        self._owns_asset_server = False
+        self._pool_workers = []
+        
+        if recycle_rss_mb and psutil is None:
+            self.log("⚠️  未安装 psutil，无法检测浏览器内存占用，recycle_rss_mb 设置不生效")
+        
+        # 守护进程的浏览器固定为1倍设备像素比，也不支持本地资源服务和请求拦截，需要这些功能时使用本地浏览器
+        if use_daemon and (intercept_assets or self.block_patterns):
+            self.log("ℹ️  已启用资源内存缓存或请求拦截，不使用渲染守护进程")
+        elif use_daemon and self.device_scale_factor == 1 and not RenderDaemonClient.is_disabled():
+            client = RenderDaemonClient()
+            if client.is_available():
+                self.daemon = client
+                self.log(f"🔗 已连接渲染守护进程 {client.address}，使用常驻浏览器")
+                return
         self.setup_driver()
+        
+        if intercept_assets:
+            self.asset_server = AssetServer()
+            self._owns_asset_server = True
+            self.log("📦 已启用本地资源内存缓存")
     
     def log(self, message):
         """输出日志信息"""
+        if self.name:
+            message = f"[{self.name}] {message}"
         if self.log_callback:
             self.log_callback(message)
         else:
             print(message)
     
+    def cancel(self):
+        """请求取消正在进行的转换（可以在任意线程调用）"""
+        self.cancel_event.set()
+    
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+    
+    def check_cancelled(self):
+        """取消令牌已设置时抛出 ConversionCancelled"""
+        if self.cancel_event.is_set():
+            raise ConversionCancelled("转换已取消")
+    
+    @contextlib.contextmanager
+    def timed(self, stage):
+        """记录代码块的耗时，计入性能统计的指定阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stats.add(stage, time.perf_counter() - start)
+    
     def setup_driver(self):
         """设置Chrome浏览器驱动"""
+        with self.timed('driver_setup'):
+            self.driver = self._create_driver()
+            self._prepare_driver()
+    
+    def _prepare_driver(self):
+        """浏览器启动后的准备工作：检测DevTools支持并预先注入就绪监听脚本"""
+        self._driver_pages = 0
+        self._driver_started = time.monotonic()
+        browser_name = (self.driver.capabilities or {}).get('browserName', '')
+        self.supports_cdp = browser_name == 'chrome' and hasattr(self.driver, 'execute_cdp_cmd')
+        if self.supports_cdp:
+            try:
+                self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': READY_TRACKER_JS})
+            except Exception:
+                # 注入失败时在首次检测时再补充注入
+                pass
+            self._apply_request_blocking()
+        if self.page_timeout:
+            # 页面加载超时由驱动报告，不必等待看门狗
+            try:
+                self.driver.set_page_load_timeout(self.page_timeout)
+            except Exception:
+                pass
+    
+    def is_driver_healthy(self, timeout=10):
+        """检查浏览器是否仍能响应命令；浏览器崩溃或卡死时返回False"""
+        if self.daemon:
+            return True
+        driver = self.driver
+        if driver is None:
+            return False
+        
+        result = []
+        
+        def probe():
+            try:
+                driver.execute_script("return 1;")
+                result.append(True)
+            except Exception:
+                pass
+        
+        # 卡死的浏览器不会返回，在单独的线程中检测并限制等待时间
+        thread = threading.Thread(target=probe, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        return bool(result)
+    
+    def _kill_driver(self, driver):
+        """强制结束浏览器驱动进程及其启动的浏览器进程，不等待正在执行的命令"""
+        process = getattr(getattr(driver, 'service', None), 'process', None)
+        if process is None:
+            return
+        if psutil is not None:
+            try:
+                for child in psutil.Process(process.pid).children(recursive=True):
+                    child.kill()
+            except psutil.Error:
+                pass
+        try:
+            process.kill()
+        except Exception:
+            pass
+    
+    def restart_driver(self, reason):
+        """结束当前浏览器（卡死的浏览器会被强制结束）并启动新的浏览器"""
+        self.log(f"♻️  正在重新启动浏览器: {reason}")
+        self.stats.count('driver_restart')
+        driver, self.driver = self.driver, None
+        if driver is not None:
+            self._kill_driver(driver)
+            # 驱动进程已结束，quit 只负责清理，放到后台避免阻塞
+            threading.Thread(target=driver.quit, daemon=True).start()
+        # 已经预先启动好的备用浏览器可以直接使用
+        spare = self._take_spare_driver(wait=True)
+        if spare is None:
+            self.setup_driver()
+        else:
+            self.driver = spare
+            self._prepare_driver()
+    
+    def driver_rss(self):
+        """浏览器驱动及其启动的所有浏览器进程的内存占用（字节），无法检测时返回None"""
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+        if process is None or psutil is None:
+            return None
+        try:
+            root = psutil.Process(process.pid)
+            total = root.memory_info().rss
+            for child in root.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            return total
+        except psutil.Error:
+            return None
+    
+    def sampled_driver_rss(self):
+        """
+        当前浏览器的内存占用（字节），同一浏览器每处理一个页面只遍历一次进程树，
+        提前启动备用浏览器和回收的判断共用同一次检测结果
+        """
+        key = (self._driver_started, self._driver_pages)
+        if self._rss_sample is None or self._rss_sample[0] != key:
+            self._rss_sample = (key, self.driver_rss())
+        return self._rss_sample[1]
+    
+    def recycle_reason(self, threshold=1.0):
+        """
+        按回收策略检查当前浏览器，返回需要回收的原因，不需要时返回None
+        
+        参数:
+        threshold: 按各项上限的该比例判断，小于1时用于提前启动备用浏览器
+        """
+        if self.daemon or self.driver is None:
+            return None
+        if self.recycle_pages and self._driver_pages >= self.recycle_pages * threshold:
+            return f"已处理 {self._driver_pages} 个页面"
+        minutes = (time.monotonic() - self._driver_started) / 60
+        if self.recycle_minutes and minutes >= self.recycle_minutes * threshold:
+            return f"已运行 {minutes:.0f} 分钟"
+        if self.recycle_rss_mb:
+            rss = self.sampled_driver_rss()
+            if rss is not None and rss >= self.recycle_rss_mb * 1024 * 1024 * threshold:
+                return f"内存占用 {rss / 1024 / 1024:.0f}MB"
+        return None
+    
+    def maybe_recycle_driver(self, wait=False):
+        """
+        页面之间调用：接近回收条件时在后台启动备用浏览器，达到回收条件且备用浏览器已就绪时换用备用浏览器
+        
+        备用浏览器还在启动时继续使用当前浏览器，不阻塞转换；返回是否更换了浏览器
+        
+        参数:
+        wait: 达到回收条件但备用浏览器尚未就绪时等待其启动完成
+        """
+        if self._spare is None:
+            if self.recycle_reason(RECYCLE_PREWARM_RATIO) is None:
+                return False
+            self._start_spare_driver()
+        
+        reason = self.recycle_reason()
+        if reason is None:
+            return False
+        spare = self._take_spare_driver(wait=wait)
+        if spare is None:
+            return False
+        
+        self.log(f"♻️  回收浏览器（{reason}），换用已预先启动的浏览器")
+        self.stats.count('driver_recycle')
+        driver, self.driver = self.driver, spare
+        self._prepare_driver()
+        threading.Thread(target=self._quit_driver, args=(driver,), daemon=True).start()
+        return True
+    
+    def _quit_driver(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            self._kill_driver(driver)
+    
+    def _start_spare_driver(self):
+        """在后台线程中启动备用浏览器（已经在启动或已就绪时不重复启动）"""
+        if self._spare is not None:
+            return
+        spare = {'driver': None, 'ready': threading.Event()}
+        self._spare = spare
+        
+        def create():
+            start = time.perf_counter()
+            try:
+                spare['driver'] = self._create_driver()
+                self.stats.add('driver_setup', time.perf_counter() - start)
+            except Exception as e:
+                self.log(f"⚠️  备用浏览器启动失败: {e}")
+            finally:
+                spare['ready'].set()
+        
+        threading.Thread(target=create, daemon=True).start()
+    
+    def _take_spare_driver(self, wait=False):
+        """
+        取出已就绪的备用浏览器，没有备用浏览器或尚未就绪时返回None
+        
+        参数:
+        wait: 备用浏览器正在启动时等待其完成
+        """
+        spare = self._spare
+        if spare is None:
+            return None
+        if not spare['ready'].is_set() and not wait:
+            return None
+        spare['ready'].wait()
+        self._spare = None
+        return spare['driver']
+    
+    @contextlib.contextmanager
+    def watchdog(self, label):
+        """
+        页面处理看门狗：代码块执行超过 page_timeout 秒时强制结束浏览器，
+        使卡在浏览器命令上的线程抛出异常，随后由重试逻辑重新启动浏览器
+        """
+        if not self.page_timeout or self.daemon or self.driver is None:
+            yield
+            return
+        
+        driver = self.driver
+        fired = threading.Event()
+        
+        def expire():
+            fired.set()
+            self.log(f"⏰ 页面处理超过 {self.page_timeout} 秒，强制结束浏览器: {label}")
+            self.stats.count('page_timeout')
+            self._kill_driver(driver)
+        
+        timer = threading.Timer(self.page_timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if fired.is_set():
+                raise TimeoutError(f"页面处理超过 {self.page_timeout} 秒: {label}") from e
+            raise
+        finally:
+            timer.cancel()
+    
+    def _apply_request_blocking(self):
+        """通过DevTools的 Network.setBlockedURLs 拦截匹配的请求（对当前标签页生效）"""
+        if not self.block_patterns or not self.supports_cdp:
+            return
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.block_patterns})
+        except Exception as e:
+            self.log(f"⚠️  设置请求拦截失败: {e}")
+    
+    def page_url(self, html_file_path):
+        """HTML文件的加载地址：启用资源内存缓存时走本地资源服务，否则使用 file:// 地址"""
+        if self.asset_server:
+            return self.asset_server.url_for(html_file_path)
+        return path_to_file_url(html_file_path)
+    
+    def _create_driver(self):
+        """依次尝试系统Chrome、自动下载的ChromeDriver和Edge，返回新建的浏览器驱动"""
         try:
             chrome_options = Options()
             chrome_options.add_argument('--headless')  # 无头模式
@@ -46,24 +1754,24 @@ class HTMLToImageConverter:
             chrome_options.add_argument('--disable-extensions')
             chrome_options.add_argument('--disable-web-security')
             chrome_options.add_argument('--allow-running-insecure-content')
-            chrome_options.add_argument('--force-device-scale-factor=1')
+            chrome_options.add_argument(f'--force-device-scale-factor={self.device_scale_factor:g}')
             
             self.log("正在初始化浏览器驱动...")
             
             # 尝试使用系统已安装的Chrome
             try:
-                self.driver = webdriver.Chrome(options=chrome_options)
+                driver = webdriver.Chrome(options=chrome_options)
                 self.log("✅ 使用系统Chrome浏览器初始化成功！")
-                return
+                return driver
             except Exception as e1:
                 self.log(f"⚠️  系统Chrome初始化失败，尝试自动下载驱动...")
             
             # 备用方案：自动下载ChromeDriver
             try:
                 service = Service(ChromeDriverManager().install())
-                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+                driver = webdriver.Chrome(service=service, options=chrome_options)
                 self.log("✅ 自动下载ChromeDriver成功！")
-                return
+                return driver
             except Exception as e2:
                 self.log(f"⚠️  自动下载ChromeDriver失败，尝试Edge浏览器...")
                 
@@ -79,12 +1787,12 @@ class HTMLToImageConverter:
                 edge_options.add_argument('--disable-dev-shm-usage')
                 edge_options.add_argument('--disable-gpu')
                 edge_options.add_argument('--window-size=1920,1080')
-                edge_options.add_argument('--force-device-scale-factor=1')
+                edge_options.add_argument(f'--force-device-scale-factor={self.device_scale_factor:g}')
                 
                 edge_service = EdgeService(EdgeChromiumDriverManager().install())
-                self.driver = webdriver.Edge(service=edge_service, options=edge_options)
+                driver = webdriver.Edge(service=edge_service, options=edge_options)
                 self.log("✅ Edge浏览器初始化成功！")
-                return
+                return driver
             except Exception as e3:
                 self.log(f"⚠️  Edge浏览器初始化失败: {e3}")
             
@@ -95,81 +1803,498 @@ class HTMLToImageConverter:
             self.log(error_msg)
             raise Exception(error_msg)
     
-    def convert_html_to_image(self, html_file_path, output_path, image_format='PNG', width=1920, height=1080):
+    def convert_html_to_image(self, html_file_path, output_path, image_format='PNG', width=1920, height=1080, quality=95):
+        """
+        将HTML文件转换为图片
+        
+        参数:
+        html_file_path: HTML文件路径
+        output_path: 输出图片路径
+        image_format: 图片格式 ('PNG'、'JPEG'、'WEBP' 或 'AVIF')
+        width: 图片宽度
+        height: 图片高度
+        quality: 有损格式的质量 (1-100)，设置了 encode_options['target_size'] 时为质量上限
+        """
+        try:
+            output_path = normalize_output_path(output_path, image_format)
+            hit, cache_entries = self.fetch_from_cache(html_file_path, output_path, image_format, width, height,
+                                                       quality)
+            if hit:
+                return True
+            
+            self.maybe_recycle_driver()
+            png_data = self.render_html_to_png(html_file_path, width, height)
+            saved_path = self.save_capture(png_data, output_path, image_format, quality)
+            self.store_in_cache(cache_entries)
+            
+            self.log(f"✅ 转换完成: {os.path.basename(saved_path)}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 转换失败 {os.path.basename(html_file_path)}: {str(e)}")
+            return False
+    
+    def render_params(self, image_format, width, height, quality):
+        """影响输出图片的渲染参数"""
+        params = {'format': image_format.upper(), 'width': width, 'height': height, 'quality': quality}
+        if self.encode_options:
+            params['encode'] = dict(sorted(self.encode_options.items()))
+        if self.device_scale_factor != 1:
+            params['scale'] = self.device_scale_factor
+        if self.variants:
+            params['variants'] = self.variants
+        # 拦截的请求和通过本地资源服务加载都会影响页面内容
+        if self.intercept_assets:
+            params['intercept_assets'] = True
+        if self.block_patterns:
+            params['block'] = sorted(self.block_patterns)
+        return params
+    
+    def output_paths(self, output_path, image_format='PNG'):
+        """一个页面实际输出的文件路径列表：设置了派生输出时为各个带后缀的文件"""
+        output_path = normalize_output_path(output_path, image_format)
+        if not self.variants:
+            return [output_path]
+        return [variant_output_path(output_path, variant['name']) for variant in self.variants]
+    
+    def required_scale_factor(self):
+        """派生输出需要的设备像素比：各倍数输出中的最大值，至少为1"""
+        return max([1] + [variant['scale'] for variant in self.variants if 'scale' in variant])
+    
+    def set_variants(self, variants):
+        """
+        更换派生输出设置
+        
+        需要的设备像素比高于当前浏览器时重新启动浏览器（使用守护进程时改为启动本地浏览器）；
+        清空派生输出时恢复创建转换器时的设备像素比
+        """
+        self.variants = [parse_variant(variant) for variant in variants or []]
+        if self.variants:
+            required = max(self.device_scale_factor, self.required_scale_factor())
+        else:
+            required = self._base_scale_factor
+        if required == self.device_scale_factor:
+            return
+        
+        self.log(f"🔍 设备像素比改为 {required:g} 倍，重新启动浏览器")
+        self.device_scale_factor = required
+        # 备用浏览器按原来的设备像素比启动，不能再使用
+        self._discard_spare_driver()
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+        self.daemon = None
+        self.setup_driver()
+    
+    def save_capture(self, png_data, output_path, image_format='PNG', quality=95):
+        """按当前的编码选项和派生输出设置编码保存截图，记录耗时，返回实际保存的（第一个）路径"""
+        timings = {}
+        saved_path = encode_and_save(png_data, output_path, image_format, quality, timings, self.encode_options,
+                                     self.variants, self.device_scale_factor)
+        self.stats.record_output(self.output_paths(output_path, image_format), timings)
+        return saved_path
+    
+    @staticmethod
+    def check_encode_options(encode_options):
+        """检查编码选项，返回去掉未设置项后的字典"""
+        options = {key: value for key, value in (encode_options or {}).items() if value is not None}
+        unknown = set(options) - set(ENCODE_OPTIONS)
+        if unknown:
+            raise ValueError(f"不支持的编码选项: {', '.join(sorted(unknown))}")
+        return options
+    
+    def fetch_from_cache(self, html_file_path, output_path, image_format, width, height, quality):
+        """
+        查找渲染缓存，返回 (是否命中, 缓存条目)；命中时直接输出缓存图片，有派生输出时全部命中才算命中
+        
+        未命中时渲染完成后把返回的缓存条目交给 store_in_cache：缓存键只在渲染前按当时的页面内容计算一次，
+        渲染期间源文件被修改时也不会把图片记到修改后内容的键下
+        """
+        if not self.cache:
+            return False, None
+        try:
+            entries = self.cache_entries(html_file_path, output_path, image_format, width, height, quality)
+        except OSError as e:
+            self.log(f"⚠️  读取渲染缓存失败: {e}")
+            return False, None
+        try:
+            if all(self.cache.fetch(key, path) for key, path in entries):
+                self.log(f"♻️  命中渲染缓存: {os.path.basename(entries[0][1])}")
+                return True, entries
+        except OSError as e:
+            self.log(f"⚠️  读取渲染缓存失败: {e}")
+        return False, entries
+    
+    def cache_entries(self, html_file_path, output_path, image_format, width, height, quality):
+        """返回每个输出文件的 (缓存键, 路径)，派生输出按其名称分别缓存"""
+        params = self.render_params(image_format, width, height, quality)
+        paths = self.output_paths(output_path, image_format)
+        if not self.variants:
+            return [(self.cache.make_key(html_file_path, params), paths[0])]
+        return [(self.cache.make_key(html_file_path, dict(params, output=variant['name'])), path)
+                for variant, path in zip(self.variants, paths)]
+    
+    def store_in_cache(self, cache_entries):
+        """把新生成的图片按 fetch_from_cache 返回的缓存条目加入渲染缓存"""
+        if not self.cache or not cache_entries:
+            return
+        try:
+            for key, path in cache_entries:
+                self.cache.store(key, path)
+        except OSError as e:
+            self.log(f"⚠️  写入渲染缓存失败: {e}")
+    
+    def render_html_to_bytes(self, html_file_path, image_format='PNG', width=1920, height=1080, quality=95):
+        """
+        将HTML文件渲染为图片数据，不写入任何文件
+        
+        参数同 convert_html_to_image，返回编码后的图片数据；失败时抛出异常
+        """
+        png_data = self.render_html_to_png(html_file_path, width, height)
+        with self.timed('encode'):
+            return encode_image(png_data, image_format, quality, self.encode_options)
+    
+    def render_html_to_png(self, html_file_path, width=1920, height=1080):
+        """加载HTML文件并截图，返回浏览器生成的PNG图片数据"""
+        # 检查HTML文件是否存在
+        if not os.path.exists(html_file_path):
+            raise FileNotFoundError(f"HTML文件不存在: {html_file_path}")
+        
+        self.check_cancelled()
+        if self.daemon:
+            return self._render_with_daemon(html_file_path, width, height)
+        
+        # 设置窗口大小
+        self.set_viewport(width, height)
+        
+        # 加载HTML文件
+        self.log(f"📄 正在处理: {os.path.basename(html_file_path)}")
+        with self.timed('navigation'):
+            self.driver.get(self.page_url(html_file_path))
+        
+        self.check_cancelled()
+        return self._capture_loaded_page(width, height)
+    
+    def render_html_string_to_png(self, html, width=1920, height=1080, base_url=None):
+        """
+        直接渲染HTML文档内容并截图，返回PNG图片数据，不需要先写入文件
+        
+        参数:
+        html: HTML文档内容（字符串或UTF-8编码的字节串）
+        width: 图片宽度
+        height: 图片高度
+        base_url: 解析相对路径资源（CSS/图片等）的基础地址，例如 path_to_file_url('项目目录')
+        """
+        if isinstance(html, bytes):
+            html = html.decode('utf-8')
+        
+        if self.daemon:
+            return self._render_with_daemon(None, width, height, html=html, base_url=base_url)
+        
+        # 设置窗口大小
+        self.set_viewport(width, height)
+        
+        self.log(f"📄 正在处理: HTML文档 ({len(html)} 字符)")
+        with self.timed('navigation'):
+            self._load_html_string(html, base_url)
+        
+        return self._capture_loaded_page(width, height)
+    
+    def render_html_string(self, html, image_format='PNG', width=1920, height=1080, quality=95, base_url=None):
+        """渲染HTML文档内容，返回编码后的图片数据；失败时抛出异常"""
+        png_data = self.render_html_string_to_png(html, width, height, base_url)
+        with self.timed('encode'):
+            return encode_image(png_data, image_format, quality, self.encode_options)
+    
+    def convert_html_string(self, html, output_path, image_format='PNG', width=1920, height=1080, quality=95,
+                            base_url=None):
+        """
+        将HTML文档内容转换为图片文件
+        
+        参数同 convert_html_to_image，html 为文档内容，base_url 为解析相对路径资源的基础地址
+        """
+        try:
+            self.maybe_recycle_driver()
+            png_data = self.render_html_string_to_png(html, width, height, base_url)
+            saved_path = self.save_capture(png_data, output_path, image_format, quality)
+            
+            self.log(f"✅ 转换完成: {os.path.basename(saved_path)}")
+            return True
+            
+        except Exception as e:
+            self.log(f"❌ 转换失败 HTML文档: {str(e)}")
+            return False
+    
+    def _load_html_string(self, html, base_url=None):
+        """
+        把HTML内容直接载入浏览器
+        
+        Chrome通过DevTools的 Page.setDocumentContent 设置文档内容；基础地址为本地目录时先打开该地址，
+        使页面获得本地文件的访问权限。其他浏览器使用 data: 地址加载。
+        """
+        if base_url:
+            html = inject_base_href(html, base_url)
+        
+        if self.supports_cdp:
+            try:
+                if base_url and base_url.lower().startswith('file:'):
+                    self.driver.get(base_url)
+                else:
+                    self.driver.get('about:blank')
+                frame_id = self.driver.execute_cdp_cmd('Page.getFrameTree', {})['frameTree']['frame']['id']
+                self.driver.execute_cdp_cmd('Page.setDocumentContent', {'frameId': frame_id, 'html': html})
+                return
+            except Exception as e:
+                self.log(f"⚠️  DevTools载入HTML失败，改用data地址: {e}")
+        
+        data = base64.b64encode(html.encode('utf-8')).decode('ascii')
+        self.driver.get(f"data:text/html;charset=utf-8;base64,{data}")
+    
+    def _capture_loaded_page(self, width, height):
+        """等待已载入的页面就绪后截图"""
+        # 等待页面加载完成
+        waited = self.wait_for_page_ready('load')
+        self.log(f"⏱️  页面就绪等待: {waited:.2f}秒")
+        
+        # 执行JavaScript确保页面完全加载
+        self.driver.execute_script("window.scrollTo(0, 0);")
+        self.wait_for_page_ready('scroll')
+        
+        # 截图
+        self.check_cancelled()
+        self.log("📸 正在生成截图...")
+        self._driver_pages += 1
+        return self.capture_page(width, height)
+    
+    def _render_with_daemon(self, html_file_path, width, height, html=None, base_url=None):
+        """交给渲染守护进程截图；守护进程不可用时切换为本地浏览器"""
+        options = {
+            'wait_strategy': self.wait_strategy,
+            'ready_timeout': self.ready_timeout,
+            'quiet_period': self.quiet_period,
+            'tile_height': self.tile_height,
+            'max_capture_height': self.max_capture_height
+        }
+        try:
+            if html is not None:
+                self.log(f"📄 正在处理(守护进程): HTML文档 ({len(html)} 字符)")
+                with self.timed('daemon_render'):
+                    return self.daemon.render_png_from_string(html, width, height, base_url, **options)
+            self.log(f"📄 正在处理(守护进程): {os.path.basename(html_file_path)}")
+            with self.timed('daemon_render'):
+                return self.daemon.render_png(html_file_path, width, height, **options)
+        except RenderDaemonError as e:
+            # 请求本身有误（4xx）时本地浏览器同样会失败；守护进程内部错误、令牌失效或文件不在守护进程
+            # 允许的目录内时改用本地浏览器
+            if e.status < 500 and e.status not in (401, 403):
+                raise
+            self.log(f"⚠️  渲染守护进程出错，改用本地浏览器: {e}")
+            return self._fall_back_to_local(html_file_path, width, height, html, base_url)
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+            self.log(f"⚠️  渲染守护进程连接失败，改用本地浏览器: {e}")
+            return self._fall_back_to_local(html_file_path, width, height, html, base_url)
+    
+    def _fall_back_to_local(self, html_file_path, width, height, html=None, base_url=None):
+        """停止使用守护进程，启动本地浏览器重新渲染"""
+        self.daemon = None
+        self.setup_driver()
+        if html is not None:
+            return self.render_html_string_to_png(html, width, height, base_url)
+        return self.render_html_to_png(html_file_path, width, height)
+    
+    def set_viewport(self, width, height):
+        """设置窗口尺寸；超过分块截图阈值的高度只在截图时分块覆盖，窗口不会设置得过高"""
+        with self.timed('resize'):
+            self.driver.set_window_size(width, min(height, self.max_capture_height))
+        self.log(f"📐 设置窗口尺寸: {width}x{height}")
+    
+    def get_page_height(self):
+        """获取页面的实际内容高度，失败时返回0"""
+        try:
+            with self.timed('height_probe'):
+                return int(self.driver.execute_script(
+                    "return Math.max(document.body.scrollHeight, document.body.offsetHeight, "
+                    "document.documentElement.clientHeight, document.documentElement.scrollHeight, "
+                    "document.documentElement.offsetHeight);"
+                ) or 0)
+        except Exception:
+            return 0
+    
+    def capture_page(self, width, height):
         """
-        将HTML文件转换为图片
+        对当前页面进行全页截图，返回PNG图片数据；超高页面分块截图，返回 TiledCanvas
         
-        参数:
-        html_file_path: HTML文件路径
-        output_path: 输出图片路径
-        image_format: 图片格式 ('PNG' 或 'JPEG')
-        width: 图片宽度
-        height: 图片高度
+        Chrome浏览器通过DevTools的 Page.captureScreenshot 一次截取整页，
+        无需调整窗口大小和重新布局；其他浏览器（如Edge）或DevTools截图失败时，
+        退回到调整窗口高度后截图的方式。
+        """
+        total_height = self.get_page_height()
+        
+        capture_height = max(height, total_height)
+        if capture_height > self.max_capture_height:
+            return self._capture_tiled(width, capture_height)
+        
+        if self.supports_cdp:
+            try:
+                if total_height > height:
+                    self.log(f"📏 全页截图高度: {width}x{total_height}")
+                with self.timed('screenshot'):
+                    return self._capture_with_cdp(width, capture_height)
+            except Exception as e:
+                self.log(f"⚠️  DevTools全页截图失败，改用调整窗口方式: {e}")
+        
+        # 获取页面的实际高度并调整窗口
+        if total_height > height:
+            with self.timed('resize'):
+                self.driver.set_window_size(width, total_height)
+            self.log(f"📏 自适应高度调整为: {width}x{total_height}")
+            waited = self.wait_for_page_ready('resize')
+            self.log(f"⏱️  重新布局等待: {waited:.2f}秒")
+        
+        with self.timed('screenshot'):
+            return self.driver.get_screenshot_as_png()
+    
+    def _capture_tiled(self, width, total_height):
+        """
+        分块截图：窗口高度固定为一块的高度，逐块滚动页面截取视口并写入内存映射的画布
+        
+        每一块截图后立即写入画布并释放，内存占用与页面总高度无关；
+        第一块之后隐藏固定定位的元素，避免导航栏等在拼接结果中重复出现
         """
+        tile_height = min(self.tile_height, self.max_capture_height)
+        self.log(f"🧩 分块截图: {width}x{total_height}，每块高度 {tile_height}")
+        window_size = self.driver.get_window_size()
+        with self.timed('resize'):
+            self.driver.set_window_size(width, tile_height)
+        self.wait_for_page_ready('resize')
+        viewport_height = int(self.driver.execute_script("return window.innerHeight;") or tile_height)
+        
+        canvas = None
+        y = 0
+        tiles = 0
+        screenshot_time = 0.0
         try:
-            # 检查HTML文件是否存在
-            if not os.path.exists(html_file_path):
-                raise FileNotFoundError(f"HTML文件不存在: {html_file_path}")
-            
-            # 设置窗口大小
-            self.driver.set_window_size(width, height)
-            self.log(f"📐 设置窗口尺寸: {width}x{height}")
-            
-            # 加载HTML文件
-            file_url = f"file:///{os.path.abspath(html_file_path).replace(os.sep, '/')}"
-            self.log(f"📄 正在处理: {os.path.basename(html_file_path)}")
-            self.driver.get(file_url)
-            
-            # 等待页面加载完成
-            time.sleep(3)
-            
-            # 执行JavaScript确保页面完全加载
-            self.driver.execute_script("window.scrollTo(0, 0);")
-            time.sleep(1)
+            while y < total_height:
+                self.check_cancelled()
+                scroll_y = int(self.driver.execute_script(
+                    "window.scrollTo(0, arguments[0]); return Math.round(window.scrollY);", y))
+                if tiles:
+                    self.wait_for_page_ready('tile')
+                if scroll_y + viewport_height <= y:
+                    # 页面已经滚动到底，剩余区域没有内容
+                    break
+                
+                start = time.perf_counter()
+                png_data = self.driver.get_screenshot_as_png()
+                screenshot_time += time.perf_counter() - start
+                with Image.open(io.BytesIO(png_data)) as tile:
+                    if canvas is None:
+                        # 按截图的实际像素比例分配画布
+                        scale = tile.width / width
+                        canvas = TiledCanvas(tile.width, int(round(total_height * scale)))
+                    top = int(round((y - scroll_y) * scale))
+                    canvas_top = int(round(y * scale))
+                    rows = min(tile.height - top, canvas.height - canvas_top)
+                    canvas.write_rows(tile.crop((0, top, tile.width, top + rows)), canvas_top)
+                
+                tiles += 1
+                if tiles == 1:
+                    self.driver.execute_script(HIDE_FIXED_ELEMENTS_JS)
+                y = scroll_y + viewport_height
             
-            # 获取页面的实际高度并调整窗口
+            if canvas is not None and y < total_height:
+                canvas.fill_rows(int(round(y * scale)))
+        except Exception:
+            if canvas is not None:
+                canvas.close()
+            raise
+        finally:
             try:
-                total_height = self.driver.execute_script(
-                    "return Math.max(document.body.scrollHeight, document.body.offsetHeight, "
-                    "document.documentElement.clientHeight, document.documentElement.scrollHeight, "
-                    "document.documentElement.offsetHeight);"
-                )
-                if total_height > height:
-                    self.driver.set_window_size(width, total_height)
-                    self.log(f"📏 自适应高度调整为: {width}x{total_height}")
-                    time.sleep(2)
+                self.driver.execute_script(RESTORE_FIXED_ELEMENTS_JS + "window.scrollTo(0, 0);")
+                self.driver.set_window_size(window_size['width'], window_size['height'])
             except Exception:
-                # 如果获取高度失败，使用默认高度
                 pass
-            
-            # 截图
-            self.log("📸 正在生成截图...")
-            
-            # 确保输出目录存在
-            output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            if image_format.upper() == 'JPEG':
-                # 先截图为PNG，然后转换为JPEG
-                temp_png = output_path.replace('.jpg', '_temp.png').replace('.jpeg', '_temp.png')
-                self.driver.save_screenshot(temp_png)
-                self.convert_png_to_jpeg(temp_png, output_path)
-                # 删除临时PNG文件
-                if os.path.exists(temp_png):
-                    os.remove(temp_png)
-            else:
-                # 直接保存为PNG
-                if not output_path.lower().endswith('.png'):
-                    output_path += '.png'
-                self.driver.save_screenshot(output_path)
-            
-            self.log(f"✅ 转换完成: {os.path.basename(output_path)}")
-            return True
-            
+        
+        # 一个页面的所有分块截图计为一次截图耗时
+        self.stats.add('screenshot', screenshot_time)
+        if canvas is None:
+            raise Exception("分块截图没有得到任何内容")
+        self.log(f"🧩 分块截图完成: 共 {tiles} 块，输出 {canvas.width}x{canvas.height}")
+        return canvas
+    
+    def _capture_with_cdp(self, width, height):
+        """通过DevTools协议截取指定区域（超出视口部分同样截取），返回PNG图片数据"""
+        result = self.driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': 'png',
+            'captureBeyondViewport': True,
+            'clip': {'x': 0, 'y': 0, 'width': width, 'height': height, 'scale': 1},
+        })
+        return base64.b64decode(result['data'])
+    
+    def wait_for_page_ready(self, stage='load'):
+        """
+        等待页面就绪，返回实际等待的秒数
+        
+        参数:
+        stage: 当前阶段 ('load' 页面加载, 'scroll' 滚动, 'resize' 调整窗口, 'tile' 分块截图时滚动到下一块)
+        
+        智能策略依次确认 document.readyState、document.fonts.ready、图片加载完成，
+        并要求网络请求和DOM变化静默 quiet_period 秒；超过 ready_timeout 时放弃等待。
+        """
+        start = time.perf_counter()
+        
+        if self.wait_strategy == 'fixed':
+            # 等待期间收到取消请求时立即返回
+            self.cancel_event.wait(FIXED_WAITS.get(stage, 1))
+            waited = time.perf_counter() - start
+            self.stats.add('wait', waited)
+            self.check_cancelled()
+            return waited
+        
+        # 滚动是同步操作，无需额外等待
+        if stage == 'scroll':
+            return 0.0
+        
+        deadline = start + self.ready_timeout
+        last_resources = None
+        try:
+            while True:
+                ready, last_resources = self.probe_page_ready(last_resources)
+                if ready:
+                    break
+                
+                if time.perf_counter() >= deadline:
+                    self.log(f"⚠️  等待页面就绪超时（{self.ready_timeout}秒），继续截图")
+                    break
+                self.check_cancelled()
+                time.sleep(READY_POLL_INTERVAL)
+        except ConversionCancelled:
+            self.stats.add('wait', time.perf_counter() - start)
+            raise
         except Exception as e:
-            self.log(f"❌ 转换失败 {os.path.basename(html_file_path)}: {str(e)}")
-            return False
+            self.log(f"⚠️  页面就绪检测失败，继续截图: {e}")
+        
+        waited = time.perf_counter() - start
+        self.stats.add('wait', waited)
+        return waited
+    
+    def probe_page_ready(self, last_resources=None, navigating=False):
+        """
+        检测一次当前页面是否就绪（不等待），返回 (是否就绪, 本次资源数量)
+        
+        连续两次检测的资源数量相同才认为网络已经静默，因此需要传入上一次返回的资源数量；
+        navigating 为True表示刚从 about:blank 发起跳转，页面地址仍是 about: 时说明新页面尚未开始加载
+        """
+        state = self.driver.execute_script(READY_TRACKER_JS + READY_PROBE_JS) or {}
+        ready = (not (navigating and state.get('url', '').startswith('about:'))
+                 and state.get('readyState') == 'complete'
+                 and state.get('fonts') == 'loaded'
+                 and state.get('imagesPending', 0) == 0
+                 and state.get('resources') == last_resources
+                 and state.get('idle', 0) >= self.quiet_period * 1000)
+        return ready, state.get('resources')
     
     def convert_png_to_jpeg(self, png_path, jpeg_path, quality=95):
         """
@@ -181,21 +2306,20 @@ class HTMLToImageConverter:
         quality: JPEG质量 (1-100)
         """
         try:
-            with Image.open(png_path) as img:
-                # 如果图片有透明通道，需要转换为RGB
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # 创建白色背景
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                img.save(jpeg_path, 'JPEG', quality=quality)
+            with open(png_path, 'rb') as f:
+                save_image_bytes(jpeg_path, encode_image(f.read(), 'JPEG', quality))
         except Exception as e:
             self.log(f"PNG转JPEG失败: {e}")
     
-    def batch_convert(self, html_files, output_dir, image_format='PNG', width=1920, height=1080, progress_callback=None):
+    def get_output_path(self, html_file, output_dir, image_format='PNG'):
+        """根据HTML文件名和图片格式生成输出文件路径"""
+        base_name = os.path.splitext(os.path.basename(html_file))[0]
+        extension = FORMAT_EXTENSIONS.get(image_format.upper(), '.png')
+        return os.path.join(output_dir, f"{base_name}{extension}")
+    
+    def batch_convert(self, html_files, output_dir, image_format='PNG', width=1920, height=1080, progress_callback=None,
+                      workers=1, quality=95, encode_processes=0, incremental=False, force=False, tabs=1,
+                      report_path=None, encode_options=None, variants=None, resume=False, cancel_event=None):
         """
         批量转换HTML文件
         
@@ -206,44 +2330,595 @@ class HTMLToImageConverter:
         width: 图片宽度
         height: 图片高度
         progress_callback: 进度回调函数
+        workers: 并行浏览器数量，大于1时启用浏览器池模式
+        quality: 有损格式（JPEG/WEBP/AVIF）的质量 (1-100)
+        encode_processes: 图片编码进程数，大于0时浏览器截图后立即渲染下一页，
+                          编码和保存交给进程池并行完成
+        incremental: 增量模式，只重新生成源文件、引用资源或参数发生变化的文件
+        force: 增量模式下仍然强制全部重新生成
+        tabs: 每个浏览器同时打开的标签页数量，大于1时多个页面在同一浏览器中并发加载
+        report_path: 性能报告的导出路径（.json 或 .csv），报告同时输出到日志并保存在 last_report 中
+        encode_options: 图片编码选项字典，设置后替换转换器的 encode_options，支持的键见 ENCODE_OPTIONS
+        variants: 派生输出列表（如 ['1x', '2x', '300w']），设置后替换转换器的 variants，
+                  每个页面只渲染一次，输出文件名为 名称+后缀+扩展名（如 page@2x.png）
+        resume: 断点续传，跳过上次运行（因崩溃或强制结束而中断）中已经成功的文件，
+                转换日志保存在输出目录的 .html2img_journal.jsonl 中
+        cancel_event: 取消令牌（threading.Event），设置后不再开始新的页面，正在处理的页面在下一个阶段前中止，
+                      已完成的文件照常保存后抛出 ConversionCancelled；也可以调用 cancel() 取消。
+                      未传入时本次转换使用新的令牌，转换结束后恢复转换器原来的令牌，
+                      之前的取消不影响之后的转换
         """
-        success_count = 0
+        if image_format.upper() not in available_formats():
+            raise ValueError(f"当前Pillow不支持 {image_format.upper()} 格式，可用格式: {', '.join(available_formats())}")
+        if encode_options is not None:
+            self.encode_options = self.check_encode_options(encode_options)
+        if variants is not None:
+            self.set_variants(variants)
+        
+        own_cancel_event = self.cancel_event
+        self.cancel_event = cancel_event if cancel_event is not None else threading.Event()
+        try:
+            return self._batch_convert(html_files, output_dir, image_format, width, height, progress_callback,
+                                       quality, workers, encode_processes, incremental, force, tabs, report_path,
+                                       resume)
+        finally:
+            self.cancel_event = own_cancel_event
+    
+    def _batch_convert(self, html_files, output_dir, image_format, width, height, progress_callback, quality,
+                       workers, encode_processes, incremental, force, tabs, report_path, resume):
+        """batch_convert 的实现，取消令牌已经替换为本次转换的令牌"""
         total_count = len(html_files)
+        progress = BatchProgress(total_count, progress_callback)
+        
+        # 每次批量转换单独统计各阶段耗时，此前启动浏览器的耗时一并计入
+        self.stats = self.stats.next_batch()
+        progress.listeners.append(lambda html_file, output_file, ok: self.stats.add_page(ok))
         
         self.log(f"🚀 开始批量转换，共 {total_count} 个文件")
         
-        for i, html_file in enumerate(html_files, 1):
-            self.log(f"\n📋 进度: {i}/{total_count}")
+        manifest = None
+        if incremental:
+            manifest = BatchManifest(output_dir)
+            html_files = self._skip_up_to_date(html_files, output_dir, image_format, width, height, quality,
+                                               manifest, progress, force)
             
-            # 生成输出文件名
-            base_name = os.path.splitext(os.path.basename(html_file))[0]
-            if image_format.upper() == 'JPEG':
-                output_file = os.path.join(output_dir, f"{base_name}.jpg")
+            def record(html_file, output_file, ok):
+                if ok:
+                    manifest.record(html_file, self.output_paths(output_file, image_format),
+                                    self.render_params(image_format, width, height, quality))
+            progress.listeners.append(record)
+        
+        # 每完成一个文件立即写入转换日志，中断后可以从断点继续
+        journal = BatchJournal(output_dir, self.render_params(image_format, width, height, quality), resume)
+        if resume:
+            html_files = self._skip_journaled(html_files, output_dir, image_format, journal, progress)
+        if journal.interrupted and not resume:
+            self.log("⚠️  输出目录中有上次中断的转换日志，已保留；使用断点续传（--resume）可跳过其中已完成的文件")
+        progress.listeners.append(journal.record)
+        
+        encoder = EncodePipeline(encode_processes, self.log) if encode_processes > 0 else None
+        finished = False
+        try:
+            workers = max(1, min(int(workers), len(html_files)))
+            tabs = max(1, min(int(tabs), len(html_files)))
+            if tabs > 1:
+                self._batch_convert_tabs(html_files, output_dir, image_format, width, height, quality,
+                                         progress, encoder, workers, tabs)
+            elif workers > 1:
+                self._batch_convert_pool(html_files, output_dir, image_format, width, height, quality,
+                                         progress, encoder, workers)
             else:
-                output_file = os.path.join(output_dir, f"{base_name}.png")
-            
-            # 转换文件
-            if self.convert_html_to_image(html_file, output_file, image_format, width, height):
-                success_count += 1
-            
-            # 更新进度条
-            if progress_callback:
-                progress_callback(i)
+                for html_file in html_files:
+                    if self.cancelled:
+                        break
+                    self.log(f"\n📋 进度: {progress.done + 1}/{total_count}")
+                    
+                    # 生成输出文件名
+                    output_file = self.get_output_path(html_file, output_dir, image_format)
+                    
+                    # 转换文件，完成后更新进度条
+                    self._convert_batch_item(html_file, output_file, image_format, width, height, quality,
+                                             progress, encoder)
+            finished = not self.cancelled
+        except ConversionCancelled:
+            pass
+        finally:
+            # 等待进程池中所有待编码的图片保存完毕
+            if encoder:
+                encoder.shutdown()
+            if manifest:
+                manifest.save()
+            journal.close(complete=finished)
         
+        success_count = progress.success
+        if self.cancelled:
+            self.stats.stop()
+            self.last_report = self.stats.summary()
+            self.log(f"\n⏹️  批量转换已取消，已完成: {progress.done}/{total_count}，成功: {success_count}")
+            raise ConversionCancelled(f"已完成 {progress.done}/{total_count}，成功 {success_count}")
         self.log(f"\n🎉 批量转换完成！成功: {success_count}/{total_count}")
+        if self.cache:
+            self.log(f"🗃️  渲染缓存: {self.cache.summary()}")
+        if self.asset_server:
+            self.log(f"📦 资源内存缓存: {self.asset_server.summary()}")
+        
+        self.stats.stop()
+        self.last_report = self.stats.summary()
+        for line in self.stats.format_lines():
+            self.log(line)
+        if report_path:
+            try:
+                self.stats.export(report_path)
+                self.log(f"📊 性能报告已导出: {report_path}")
+            except OSError as e:
+                self.log(f"⚠️  导出性能报告失败: {e}")
         return success_count, total_count
     
+    def _skip_up_to_date(self, html_files, output_dir, image_format, width, height, quality, manifest, progress,
+                         force):
+        """增量模式：过滤掉无需重新生成的文件并计入进度，返回需要转换的文件列表"""
+        if force:
+            self.log("🔁 强制模式：全部文件重新生成")
+            return list(html_files)
+        
+        params = self.render_params(image_format, width, height, quality)
+        pending = []
+        skipped = 0
+        for html_file in html_files:
+            output_file = self.get_output_path(html_file, output_dir, image_format)
+            if manifest.is_up_to_date(html_file, self.output_paths(output_file, image_format), params):
+                skipped += 1
+                progress.finish(True)
+            else:
+                pending.append(html_file)
+        
+        self.log(f"⏭️  增量模式：跳过 {skipped} 个未变化的文件，需要生成 {len(pending)} 个")
+        return pending
+    
+    def _skip_journaled(self, html_files, output_dir, image_format, journal, progress):
+        """断点续传：过滤掉上次运行中已经成功的文件并计入进度，返回需要转换的文件列表"""
+        pending = []
+        for html_file in html_files:
+            output_file = self.get_output_path(html_file, output_dir, image_format)
+            if journal.is_done(html_file, self.output_paths(output_file, image_format)):
+                progress.finish(True)
+            else:
+                pending.append(html_file)
+        
+        self.log(f"⏩ 断点续传：跳过 {len(html_files) - len(pending)} 个已完成的文件，剩余 {len(pending)} 个")
+        return pending
+    
+    def _convert_batch_item(self, html_file, output_file, image_format, width, height, quality, progress, encoder):
+        """转换批量任务中的单个文件；使用编码进程池时只负责渲染截图"""
+        with self.timed('page'):
+            self._convert_batch_page(html_file, output_file, image_format, width, height, quality, progress, encoder)
+    
+    def _convert_batch_page(self, html_file, output_file, image_format, width, height, quality, progress, encoder):
+        try:
+            hit, cache_entries = self.fetch_from_cache(html_file, output_file, image_format, width, height, quality)
+            if hit:
+                progress.finish(True, html_file, output_file)
+                return
+            png_data = self.render_with_retry(html_file, width, height)
+        except ConversionCancelled:
+            # 被取消的页面不计入结果，断点续传时重新转换
+            return
+        except Exception as e:
+            self.log(f"❌ 转换失败 {os.path.basename(html_file)}: {str(e)}")
+            progress.finish(False, html_file, output_file)
+            return
+        
+        self._save_capture(html_file, output_file, png_data, image_format, quality, progress, encoder, cache_entries)
+    
+    def render_with_retry(self, html_file, width, height):
+        """
+        渲染并截图，失败时按指数退避重试，浏览器崩溃或卡死时先重新启动浏览器
+        
+        每次渲染都受看门狗保护；HTML文件不存在等与浏览器无关的错误不重试
+        """
+        name = os.path.basename(html_file)
+        # 页面之间按回收策略更换浏览器（在看门狗之外进行）
+        self.maybe_recycle_driver()
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.watchdog(name):
+                    return self.render_html_to_png(html_file, width, height)
+            except (FileNotFoundError, ConversionCancelled):
+                raise
+            except Exception as e:
+                if attempt >= self.max_retries or self.cancelled:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                self.log(f"🔁 渲染失败（第 {attempt + 1} 次），{delay:.1f}秒后重试: {name}: {e}")
+                self.stats.count('retry')
+                if not self.is_driver_healthy():
+                    try:
+                        self.restart_driver("浏览器无响应")
+                    except Exception as restart_error:
+                        self.log(f"⚠️  重新启动浏览器失败: {restart_error}")
+                self.cancel_event.wait(delay)
+                self.check_cancelled()
+    
+    def _save_capture(self, html_file, output_file, png_data, image_format, quality, progress, encoder,
+                      cache_entries):
+        """编码保存一张截图（或交给编码进程池），完成后写入渲染缓存并更新进度"""
+        # 分块截图的画布基于内存映射，无法传给其他进程，直接在当前线程编码
+        if encoder is None or isinstance(png_data, TiledCanvas):
+            try:
+                saved_path = self.save_capture(png_data, output_file, image_format, quality)
+                self.store_in_cache(cache_entries)
+                self.log(f"✅ 转换完成: {os.path.basename(saved_path)}")
+                ok = True
+            except Exception as e:
+                self.log(f"❌ 转换失败 {os.path.basename(html_file)}: {str(e)}")
+                ok = False
+            progress.finish(ok, html_file, output_file)
+            return
+        
+        def on_done(ok, timings):
+            if ok:
+                self.stats.record_output(self.output_paths(output_file, image_format), timings)
+                self.store_in_cache(cache_entries)
+            progress.finish(ok, html_file, output_file)
+        
+        encoder.submit(png_data, output_file, image_format, quality, on_done=on_done, options=self.encode_options,
+                       variants=self.variants, device_scale_factor=self.device_scale_factor)
+    
+    def _batch_convert_tabs(self, html_files, output_dir, image_format, width, height, quality, progress, encoder,
+                            workers, tabs):
+        """多标签页模式的批量转换，可以与浏览器池同时使用"""
+        jobs = iter(html_files)
+        lock = threading.Lock()
+        progress.log = self.log
+        
+        def next_job():
+            if self.cancelled:
+                return None
+            with lock:
+                return next(jobs, None)
+        
+        def handle(converter, _):
+            converter._convert_in_tabs(next_job, tabs, output_dir, image_format, width, height, quality,
+                                       progress, encoder)
+        
+        self.log(f"🗂️  启用多标签页模式，每个浏览器 {tabs} 个标签页")
+        if workers > 1:
+            # 每个工作浏览器领取一个令牌，然后从共享任务来源中持续取任务
+            self.run_pool(range(workers), handle, workers)
+        else:
+            handle(self, None)
+    
+    def _convert_in_tabs(self, next_job, tabs, output_dir, image_format, width, height, quality, progress, encoder):
+        """
+        在一个浏览器中打开多个标签页，各标签页同时加载页面，哪个页面先就绪就先截图
+        
+        每个标签页截图完成后清空存储并回到 about:blank，再加载下一个任务
+        """
+        if self.driver is None:
+            # 使用守护进程时没有本地浏览器，逐个转换
+            html_file = next_job()
+            while html_file is not None:
+                output_file = self.get_output_path(html_file, output_dir, image_format)
+                self._convert_batch_item(html_file, output_file, image_format, width, height, quality,
+                                         progress, encoder)
+                html_file = next_job()
+            return
+        
+        while True:
+            retries, exhausted = self._run_tabs(next_job, tabs, output_dir, image_format, width, height, quality,
+                                                progress, encoder)
+            # 提前结束时：达到回收条件则换用备用浏览器（等待其启动完成）；
+            # 只有浏览器确实失去响应时才重新启动，备用浏览器启动失败时直接重新启动完成回收
+            if not exhausted and not self.maybe_recycle_driver(wait=True):
+                if not self.is_driver_healthy():
+                    self.restart_driver("浏览器无响应")
+                else:
+                    reason = self.recycle_reason()
+                    if reason is not None:
+                        self.restart_driver(f"回收浏览器（{reason}）")
+            # 标签页中失败的页面逐个重试，必要时重新启动浏览器
+            for html_file, output_file in retries:
+                self.check_cancelled()
+                self._convert_batch_item(html_file, output_file, image_format, width, height, quality,
+                                         progress, encoder)
+            if exhausted:
+                return
+    
+    def _run_tabs(self, next_job, tabs, output_dir, image_format, width, height, quality, progress, encoder):
+        """
+        多标签页并发加载直到任务取完，返回 (需要重试的页面列表, 任务是否已经取完)
+        
+        浏览器失去响应时提前返回，未完成的页面全部交给重试
+        """
+        retries = []
+        self.driver.set_window_size(width, min(height, self.max_capture_height))
+        main_handle = self.driver.current_window_handle
+        self._reset_tab()
+        handles = [main_handle]
+        try:
+            for _ in range(tabs - 1):
+                self.driver.switch_to.new_window('tab')
+                self._apply_request_blocking()
+                handles.append(self.driver.current_window_handle)
+        except Exception as e:
+            self.log(f"⚠️  打开新标签页失败，使用 {len(handles)} 个标签页: {e}")
+        
+        slots = dict.fromkeys(handles)
+        exhausted = False
+        recycling = False
+        try:
+            while True:
+                # 取消时放弃各标签页中未完成的页面
+                self.check_cancelled()
+                # 需要回收浏览器时不再分配新任务，等各标签页处理完后回收
+                if not recycling and not exhausted and None in slots.values():
+                    if self.recycle_reason(RECYCLE_PREWARM_RATIO):
+                        self._start_spare_driver()
+                        recycling = self.recycle_reason() is not None
+                # 给空闲的标签页分配新任务，页面加载在后台同时进行
+                for handle in handles:
+                    while slots[handle] is None and not exhausted and not recycling:
+                        html_file = next_job()
+                        if html_file is None:
+                            exhausted = True
+                            break
+                        
+                        output_file = self.get_output_path(html_file, output_dir, image_format)
+                        hit, cache_entries = self.fetch_from_cache(html_file, output_file, image_format,
+                                                                   width, height, quality)
+                        if hit:
+                            progress.finish(True, html_file, output_file)
+                            continue
+                        if not os.path.exists(html_file):
+                            self.log(f"❌ 转换失败 {os.path.basename(html_file)}: HTML文件不存在: {html_file}")
+                            progress.finish(False, html_file, output_file)
+                            continue
+                        
+                        self.driver.switch_to.window(handle)
+                        self.log(f"📄 正在处理: {os.path.basename(html_file)}")
+                        self._start_navigation(self.page_url(html_file))
+                        slots[handle] = {
+                            'html_file': html_file,
+                            'output_file': output_file,
+                            'cache_entries': cache_entries,
+                            'start': time.perf_counter(),
+                            'resources': None
+                        }
+                
+                busy = [handle for handle in handles if slots[handle]]
+                if not busy:
+                    break
+                
+                # 轮流检查各标签页，已就绪的立即截图
+                captured = False
+                failed = False
+                for handle in busy:
+                    slot = slots[handle]
+                    if self._capture_tab_if_ready(handle, slot, image_format, width, height, quality,
+                                                  progress, encoder, retries):
+                        slots[handle] = None
+                        captured = True
+                        failed = failed or slot.get('failed', False)
+                
+                if failed and not self.is_driver_healthy():
+                    self.log("⚠️  浏览器无响应，未完成的标签页改为逐个重试")
+                    retries.extend((slot['html_file'], slot['output_file']) for slot in slots.values() if slot)
+                    return retries, exhausted
+                
+                if not captured:
+                    time.sleep(READY_POLL_INTERVAL)
+        finally:
+            for handle in handles[1:]:
+                try:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+                except Exception:
+                    pass
+            try:
+                self.driver.switch_to.window(main_handle)
+            except Exception:
+                pass
+        return retries, exhausted
+    
+    def _capture_tab_if_ready(self, handle, slot, image_format, width, height, quality, progress, encoder,
+                              retries):
+        """
+        检查标签页是否就绪，就绪（或超时）时截图并重置标签页，返回是否已处理完该任务
+        
+        截图失败的页面加入 retries 稍后重试，并在 slot 中标记 failed
+        """
+        html_file = slot['html_file']
+        output_file = slot['output_file']
+        try:
+            with self.watchdog(os.path.basename(html_file)):
+                png_data = self._capture_tab(handle, slot, width, height)
+            if png_data is None:
+                return False
+        except ConversionCancelled:
+            raise
+        except Exception as e:
+            self.log(f"⚠️  标签页截图失败，稍后重试 {os.path.basename(html_file)}: {str(e)}")
+            self.stats.count('retry')
+            slot['failed'] = True
+            retries.append((html_file, output_file))
+            self._reset_tab()
+            return True
+        
+        self._reset_tab()
+        self._save_capture(html_file, output_file, png_data, image_format, quality, progress, encoder,
+                           slot['cache_entries'])
+        self.stats.add('page', time.perf_counter() - slot['start'])
+        return True
+    
+    def _capture_tab(self, handle, slot, width, height):
+        """切换到标签页检查就绪状态，就绪（或超时）时截图，尚未就绪时返回None"""
+        html_file = slot['html_file']
+        self.driver.switch_to.window(handle)
+        elapsed = time.perf_counter() - slot['start']
+        if self.wait_strategy == 'fixed':
+            ready = elapsed >= FIXED_WAITS['load']
+        else:
+            ready, slot['resources'] = self.probe_page_ready(slot['resources'], navigating=True)
+        
+        if not ready:
+            if elapsed < self.ready_timeout:
+                return None
+            self.log(f"⚠️  等待页面就绪超时（{self.ready_timeout}秒），继续截图: {os.path.basename(html_file)}")
+        self.log(f"⏱️  页面就绪等待: {elapsed:.2f}秒 ({os.path.basename(html_file)})")
+        self.stats.add('wait', elapsed)
+        
+        self.driver.execute_script("window.scrollTo(0, 0);")
+        self._driver_pages += 1
+        png_data = self.capture_page(width, height)
+        if not self.supports_cdp or isinstance(png_data, TiledCanvas):
+            # 调整窗口方式和分块截图会改变整个窗口的大小，恢复后再处理其他标签页
+            self.driver.set_window_size(width, min(height, self.max_capture_height))
+        return png_data
+    
+    def _start_navigation(self, url):
+        """
+        在当前标签页开始加载页面
+        
+        Chrome通过DevTools的 Page.navigate 发起跳转，不等待加载完成即返回，
+        其他浏览器只能使用会等待加载完成的 driver.get
+        """
+        with self.timed('navigation'):
+            if self.supports_cdp:
+                try:
+                    self.driver.execute_cdp_cmd('Page.navigate', {'url': url})
+                    return
+                except Exception as e:
+                    self.log(f"⚠️  DevTools跳转失败，改为等待加载: {e}")
+            self.driver.get(url)
+    
+    def _reset_tab(self):
+        """清空当前标签页的存储并回到空白页"""
+        try:
+            self.driver.execute_script(RESET_TAB_JS)
+            self.driver.get('about:blank')
+        except Exception:
+            pass
+    
+    def spawn_worker(self, name):
+        """创建一个拥有独立浏览器驱动的同配置转换器，供浏览器池使用"""
+        worker = HTMLToImageConverter(log_callback=self.log_callback, name=name,
+                                    wait_strategy=self.wait_strategy,
+                                    ready_timeout=self.ready_timeout,
+                                    quiet_period=self.quiet_period,
+                                    use_daemon=self.use_daemon,
+                                    block_patterns=self.block_patterns,
+                                    tile_height=self.tile_height,
+                                    max_capture_height=self.max_capture_height,
+                                    encode_options=self.encode_options,
+                                    device_scale_factor=self.device_scale_factor,
+                                    variants=self.variants,
+                                    page_timeout=self.page_timeout,
+                                    max_retries=self.max_retries,
+                                    retry_backoff=self.retry_backoff,
+                                    recycle_pages=self.recycle_pages,
+                                    recycle_rss_mb=self.recycle_rss_mb,
+                                    recycle_minutes=self.recycle_minutes)
+        # 浏览器池中的转换器共享同一个渲染缓存、本地资源服务和性能统计
+        worker.cache = self.cache
+        worker.cancel_event = self.cancel_event
+        self.stats.merge(worker.stats)
+        worker.stats = self.stats
+        if worker.asset_server is None:
+            worker.asset_server = self.asset_server
+        return worker
+    
+    def _batch_convert_pool(self, html_files, output_dir, image_format, width, height, quality, progress, encoder,
+                            workers):
+        """浏览器池模式的批量转换"""
+        progress.log = self.log
+        
+        def handle(converter, html_file):
+            output_file = self.get_output_path(html_file, output_dir, image_format)
+            converter._convert_batch_item(html_file, output_file, image_format, width, height, quality,
+                                          progress, encoder)
+        
+        self.run_pool(html_files, handle, workers)
+    
+    def run_pool(self, jobs, handler, workers):
+        """
+        浏览器池：多个工作线程各自持有一个浏览器，从共享的任务来源中领取任务
+        
+        参数:
+        jobs: 任务的可迭代对象，可以是列表，也可以是逐条产生任务的生成器（如标准输入）
+        handler: 处理函数 handler(converter, job)，converter 为该工作线程使用的转换器
+        workers: 并行浏览器数量
+        
+        当前转换器的浏览器作为第一个工作者，其余工作者在各自线程中并行启动，
+        启动失败的工作者直接退出，剩余任务由其他工作者继续处理。
+        """
+        jobs = iter(jobs)
+        lock = threading.Lock()
+        
+        self.log(f"🧵 启用浏览器池模式，并行数: {workers}")
+        
+        def run_worker(index):
+            if index == 0:
+                converter = self
+            else:
+                try:
+                    converter = self.spawn_worker(f"W{index + 1}")
+                except Exception as e:
+                    self.log(f"⚠️  工作浏览器 W{index + 1} 启动失败，任务将由其他浏览器处理: {e}")
+                    return
+                with lock:
+                    self._pool_workers.append(converter)
+            
+            try:
+                while not self.cancelled:
+                    with lock:
+                        job = next(jobs, None)
+                    if job is None:
+                        return
+                    handler(converter, job)
+            except ConversionCancelled:
+                pass
+            finally:
+                if converter is not self:
+                    converter.close()
+                    with lock:
+                        if converter in self._pool_workers:
+                            self._pool_workers.remove(converter)
+        
+        threads = [threading.Thread(target=run_worker, args=(index,), daemon=True) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def _discard_spare_driver(self):
+        spare = self._take_spare_driver(wait=True)
+        if spare is not None:
+            self._quit_driver(spare)
+    
     def close(self):
-        """关闭浏览器驱动"""
+        """关闭浏览器驱动（包括浏览器池中的工作浏览器和备用浏览器）"""
+        for worker in list(self._pool_workers):
+            worker.close()
+        self._discard_spare_driver()
         if self.driver:
             self.driver.quit()
+            self.driver = None
             self.log("浏览器驱动已关闭")
+        if self.asset_server and self._owns_asset_server:
+            self.asset_server.close()
+            self.asset_server = None
 
 class HTMLToImageGUI:
+    # 转换线程通过有界事件队列向界面线程发送日志和结束通知，界面线程每隔 POLL_INTERVAL 毫秒批量处理一次
+    EVENT_QUEUE_SIZE = 1000
+    POLL_INTERVAL = 100
+    # 日志区域最多保留的行数，超出后删除最早的日志
+    MAX_LOG_LINES = 5000
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("HTML转图片工具 - 批量处理版")
-        self.root.geometry("800x600")
+        self.root.geometry("800x720")
         self.root.resizable(True, True)
         
         # 设置窗口图标和样式
@@ -255,8 +2930,24 @@ class HTMLToImageGUI:
         self.image_format = tk.StringVar(value="PNG")
         self.width = tk.StringVar(value="1920")
         self.height = tk.StringVar(value="1080")
+        self.quality = tk.StringVar(value="95")
+        self.target_size = tk.StringVar(value="")
+        self.optimize = tk.BooleanVar(value=False)
+        self.variants = tk.BooleanVar(value=False)
+        self.workers = tk.StringVar(value="1")
+        self.tabs = tk.StringVar(value="1")
+        self.incremental = tk.BooleanVar(value=False)
+        self.force = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=False)
         self.converter = None
         
+        # 转换线程与界面线程之间的通信
+        self.events = queue.Queue(maxsize=self.EVENT_QUEUE_SIZE)
+        self.pending_progress = None
+        self.dropped_logs = 0
+        self.cancel_event = None
+        self.conversion_thread = None
+        
         self.setup_ui()
         
     def setup_ui(self):
@@ -269,7 +2960,7 @@ class HTMLToImageGUI:
                                font=('Microsoft YaHei', 16, 'bold'))
         title_label.pack()
         
-        subtitle_label = ttk.Label(title_frame, text="批量将HTML文件转换为PNG/JPEG图片 (支持自定义尺寸)", 
+        subtitle_label = ttk.Label(title_frame, text=f"批量将HTML文件转换为{'/'.join(available_formats())}图片 (支持自定义尺寸)", 
                                   font=('Microsoft YaHei', 10))
         subtitle_label.pack()
         
@@ -313,8 +3004,22 @@ class HTMLToImageGUI:
         format_frame.pack(fill='x', pady=5)
         
         ttk.Label(format_frame, text="图片格式:").pack(side='left')
-        ttk.Radiobutton(format_frame, text="PNG", variable=self.image_format, value="PNG").pack(side='left', padx=10)
-        ttk.Radiobutton(format_frame, text="JPEG", variable=self.image_format, value="JPEG").pack(side='left', padx=10)
+        # WEBP和AVIF只在当前Pillow支持时显示
+        for image_format in available_formats():
+            ttk.Radiobutton(format_frame, text=image_format, variable=self.image_format,
+                            value=image_format).pack(side='left', padx=10)
+        
+        # 编码选项
+        encode_frame = ttk.Frame(output_frame)
+        encode_frame.pack(fill='x', pady=5)
+        
+        ttk.Label(encode_frame, text="图片质量:").pack(side='left')
+        ttk.Entry(encode_frame, textvariable=self.quality, width=8).pack(side='left', padx=(20, 5))
+        ttk.Label(encode_frame, text="目标大小:").pack(side='left', padx=(10, 5))
+        ttk.Entry(encode_frame, textvariable=self.target_size, width=8).pack(side='left', padx=5)
+        ttk.Label(encode_frame, text="KB (可选，JPEG/WEBP/AVIF)").pack(side='left', padx=(5, 0))
+        ttk.Checkbutton(encode_frame, text="压缩优化 (渐进式JPEG)",
+                        variable=self.optimize).pack(side='left', padx=20)
         
         # 图片尺寸
         size_frame = ttk.Frame(output_frame)
@@ -329,6 +3034,31 @@ class HTMLToImageGUI:
         height_entry.pack(side='left', padx=5)
         ttk.Label(size_frame, text="像素").pack(side='left', padx=(5, 0))
         
+        # 并行浏览器数量
+        workers_frame = ttk.Frame(output_frame)
+        workers_frame.pack(fill='x', pady=5)
+        
+        ttk.Label(workers_frame, text="并行数量:").pack(side='left')
+        workers_entry = ttk.Entry(workers_frame, textvariable=self.workers, width=8)
+        workers_entry.pack(side='left', padx=(20, 5))
+        ttk.Label(workers_frame, text=f"个浏览器 (本机CPU核心数: {os.cpu_count() or 1})").pack(side='left', padx=(5, 0))
+        ttk.Label(workers_frame, text="每个浏览器标签页:").pack(side='left', padx=(20, 5))
+        tabs_entry = ttk.Entry(workers_frame, textvariable=self.tabs, width=8)
+        tabs_entry.pack(side='left', padx=5)
+        
+        # 增量转换选项
+        incremental_frame = ttk.Frame(output_frame)
+        incremental_frame.pack(fill='x', pady=5)
+        
+        ttk.Checkbutton(incremental_frame, text="增量转换 (跳过未变化的文件)",
+                        variable=self.incremental).pack(side='left')
+        ttk.Checkbutton(incremental_frame, text="强制全部重新生成",
+                        variable=self.force).pack(side='left', padx=20)
+        ttk.Checkbutton(incremental_frame, text="同时输出 @1x/@2x/300px缩略图",
+                        variable=self.variants).pack(side='left')
+        ttk.Checkbutton(incremental_frame, text="断点续传",
+                        variable=self.resume).pack(side='left', padx=20)
+        
         # 转换按钮
         convert_frame = ttk.Frame(self.root)
         convert_frame.pack(fill='x', padx=20, pady=10)
@@ -356,10 +3086,61 @@ class HTMLToImageGUI:
         status_bar.pack(fill='x', side='bottom')
         
     def log_message(self, message):
-        """添加日志消息"""
-        self.log_text.insert('end', f"{message}\n")
+        """
+        添加日志消息，可以在任意线程中调用
+        
+        其他线程的日志先放入事件队列，由界面线程批量写入；界面长时间没有处理导致队列已满时，
+        转换线程最多等待1秒，仍然无法放入则丢弃该条日志并在之后提示丢弃的数量
+        """
+        if threading.current_thread() is threading.main_thread():
+            self.append_log([message])
+            return
+        try:
+            self.events.put(('log', message), timeout=1)
+        except queue.Full:
+            self.dropped_logs += 1
+    
+    def set_progress(self, value):
+        """记录最新进度，可以在任意线程中调用；界面线程刷新时只显示最后一次的值"""
+        self.pending_progress = value
+    
+    def append_log(self, lines):
+        """一次写入多行日志，并删除超出 MAX_LOG_LINES 的旧日志"""
+        self.log_text.insert('end', '\n'.join(lines) + '\n')
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > self.MAX_LOG_LINES:
+            self.log_text.delete('1.0', f"{line_count - self.MAX_LOG_LINES}.0")
         self.log_text.see('end')
-        self.root.update_idletasks()
+    
+    def process_events(self):
+        """界面线程定时执行：合并处理队列中的日志、更新进度，并处理转换结束通知"""
+        lines = []
+        finished = None
+        # 每次最多处理队列容量条事件，避免转换线程持续写入时界面无法响应
+        for _ in range(self.EVENT_QUEUE_SIZE):
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'log':
+                lines.append(payload)
+            else:
+                finished = payload
+        
+        if self.dropped_logs:
+            lines.append(f"⚠️  日志过多，省略了 {self.dropped_logs} 条")
+            self.dropped_logs = 0
+        if lines:
+            self.append_log(lines)
+        
+        value = self.pending_progress
+        if value is not None:
+            self.pending_progress = None
+            self.progress.config(value=value)
+        
+        if finished:
+            self.finish_conversion(*finished)
+        self.root.after(self.POLL_INTERVAL, self.process_events)
         
     def select_files(self):
         """选择HTML文件"""
@@ -424,10 +3205,36 @@ class HTMLToImageGUI:
             height = int(self.height.get())
             if width <= 0 or height <= 0:
                 raise ValueError("尺寸必须大于0")
-            if width > 10000 or height > 10000:
-                raise ValueError("尺寸不能超过10000像素")
+            if width > 10000:
+                raise ValueError("宽度不能超过10000像素")
+            # 超过分块截图阈值的高度会分块截图，不受浏览器绘制缓冲区大小的限制
+            if height > 100000:
+                raise ValueError("高度不能超过100000像素")
+        except ValueError as e:
+            messagebox.showerror("错误", f"图片尺寸输入无效：{e}\n请输入有效的数字（宽度1-10000，高度1-100000）")
+            return
+        
+        # 验证编码选项输入
+        try:
+            quality = int(self.quality.get())
+            if quality <= 0 or quality > 100:
+                raise ValueError("图片质量必须在1-100之间")
+            if self.target_size.get().strip() and float(self.target_size.get()) <= 0:
+                raise ValueError("目标大小必须大于0")
+        except ValueError as e:
+            messagebox.showerror("错误", f"编码选项输入无效：{e}")
+            return
+        
+        # 验证并行数量输入
+        try:
+            workers = int(self.workers.get())
+            if workers <= 0 or workers > 64:
+                raise ValueError("并行数量必须在1-64之间")
+            tabs = int(self.tabs.get())
+            if tabs <= 0 or tabs > 32:
+                raise ValueError("标签页数量必须在1-32之间")
         except ValueError as e:
-            messagebox.showerror("错误", f"图片尺寸输入无效：{e}\n请输入有效的数字（1-10000）")
+            messagebox.showerror("错误", f"并行数量输入无效：{e}")
             return
             
         # 禁用转换按钮，启用停止按钮
@@ -437,59 +3244,96 @@ class HTMLToImageGUI:
         # 清空日志
         self.log_text.delete(1.0, 'end')
         
+        # 设置进度条
+        self.progress.config(maximum=len(self.html_files), value=0)
+        self.pending_progress = None
+        
+        # 转换线程不直接访问界面控件，参数在界面线程中读取后传入
+        target_size = self.target_size.get().strip()
+        params = {
+            'html_files': list(self.html_files),
+            'output_dir': self.output_dir.get(),
+            'image_format': self.image_format.get(),
+            'width': width,
+            'height': height,
+            'workers': workers,
+            'tabs': tabs,
+            'quality': quality,
+            'incremental': self.incremental.get(),
+            'force': self.force.get(),
+            # 编码选项：压缩优化同时开启渐进式JPEG
+            'encode_options': {
+                'optimize': self.optimize.get() or None,
+                'progressive': self.optimize.get() or None,
+                'target_size': int(float(target_size) * 1024) if target_size else None
+            },
+            'variants': DEFAULT_VARIANTS if self.variants.get() else [],
+            'resume': self.resume.get()
+        }
+        
         # 在新线程中执行转换
-        self.conversion_thread = threading.Thread(target=self.run_conversion)
+        self.cancel_event = threading.Event()
+        self.conversion_thread = threading.Thread(target=self.run_conversion, args=(params, self.cancel_event))
         self.conversion_thread.daemon = True
         self.conversion_thread.start()
         
-    def run_conversion(self):
-        """执行转换任务"""
+    def run_conversion(self, params, cancel_event):
+        """执行转换任务（在转换线程中运行），结束后通过事件队列通知界面线程"""
+        result = None
         try:
-            # 创建转换器
-            self.converter = HTMLToImageConverter(log_callback=self.log_message)
-            
-            # 设置进度条
-            self.progress.config(maximum=len(self.html_files), value=0)
-            
-            # 获取尺寸参数
-            width = int(self.width.get())
-            height = int(self.height.get())
+            # 创建转换器：派生输出在创建时传入，直接按需要的设备像素比启动浏览器，避免批量转换时再重新启动
+            self.converter = HTMLToImageConverter(log_callback=self.log_message, variants=params['variants'])
+            if cancel_event.is_set():
+                raise ConversionCancelled("转换已取消")
             
             # 批量转换
             success_count, total_count = self.converter.batch_convert(
-                self.html_files, 
-                self.output_dir.get(), 
-                self.image_format.get(),
-                width,
-                height,
-                progress_callback=lambda i: self.progress.config(value=i)
+                progress_callback=self.set_progress,
+                cancel_event=cancel_event,
+                **params
             )
             
             # 显示结果
             if success_count == total_count:
-                messagebox.showinfo("完成", f"转换完成！\n成功转换 {success_count} 个文件")
+                result = ('info', "完成", f"转换完成！\n成功转换 {success_count} 个文件")
             else:
-                messagebox.showwarning("部分完成", f"转换完成！\n成功: {success_count}/{total_count}")
-                
+                result = ('warning', "部分完成", f"转换完成！\n成功: {success_count}/{total_count}")
+        except ConversionCancelled as e:
+            result = ('info', "已停止", f"转换已停止\n{str(e)}")
         except Exception as e:
-            messagebox.showerror("错误", f"转换过程中发生错误:\n{str(e)}")
-            
+            result = ('error', "错误", f"转换过程中发生错误:\n{str(e)}")
         finally:
             # 关闭转换器
             if self.converter:
                 self.converter.close()
-                
-            # 恢复按钮状态
-            self.convert_btn.config(state='normal')
-            self.stop_btn.config(state='disabled')
-            self.progress.config(value=0)
+                self.converter = None
+            self.events.put(('done', result))
+    
+    def finish_conversion(self, kind, title, message):
+        """转换结束（在界面线程中运行）：恢复按钮状态并显示结果"""
+        self.convert_btn.config(state='normal')
+        self.stop_btn.config(state='disabled')
+        self.progress.config(value=0)
+        self.cancel_event = None
+        
+        if kind == 'info':
+            messagebox.showinfo(title, message)
+        elif kind == 'warning':
+            messagebox.showwarning(title, message)
+        else:
+            messagebox.showerror(title, message)
             
     def stop_conversion(self):
-        """停止转换"""
-        if self.converter:
-            self.converter.close()
-        self.log_message("⏹️ 用户停止了转换")
-        
+        """
+        停止转换：只设置取消令牌，由转换线程在页面的各阶段之间检查后自行结束并关闭浏览器，
+        已经完成的文件照常保存
+        """
+        if self.cancel_event is None or self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.stop_btn.config(state='disabled')
+        self.log_message("⏹️ 用户停止了转换，正在等待当前页面结束...")
+    
     def run(self):
         """运行GUI"""
         self.log_message("🎉 HTML转图片工具已启动！")
@@ -498,14 +3342,301 @@ class HTMLToImageGUI:
         self.log_message("2. 选择输出目录")
         self.log_message("3. 选择图片格式 (PNG/JPEG)")
         self.log_message("4. 设置图片尺寸 (宽度x高度)")
-        self.log_message("5. 点击'开始转换'")
-        self.log_message("6. 支持自适应高度调整")
+        self.log_message("5. 设置并行数量 (多个浏览器同时转换)")
+        self.log_message("6. 点击'开始转换'")
+        self.log_message("7. 支持自适应高度调整")
         self.log_message("")
         
+        self.root.after(self.POLL_INTERVAL, self.process_events)
         self.root.mainloop()
 
+def collect_input_files(inputs, recursive=False):
+    """
+    展开命令行输入：支持文件、目录（查找其中的 *.html/*.htm）和通配符
+    
+    返回去重后的HTML文件列表，保持输入顺序
+    """
+    html_files = []
+    seen = set()
+    
+    def add(path):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            html_files.append(path)
+    
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, '**') if recursive else item
+            matches = glob.glob(os.path.join(pattern, '*.html'), recursive=recursive) + \
+                glob.glob(os.path.join(pattern, '*.htm'), recursive=recursive)
+            for path in sorted(matches):
+                add(path)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path):
+                    add(path)
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            print(f"⚠️  找不到输入: {item}", file=sys.stderr)
+    
+    return html_files
+
+def iter_stream_jobs(stream):
+    """
+    逐行读取标准输入中的任务，读到一条就产生一条，不会预先读完整个任务列表
+    
+    每行可以是:
+    - HTML文件路径
+    - 以 < 开头的单行HTML文档
+    - NDJSON对象: {"path": "a.html"} 或 {"html": "<html>...</html>"}，
+      可选字段 output/width/height/format/quality/base_dir/base_url
+    """
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        
+        if line.startswith('{'):
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                job = {'error': f"无效的JSON: {e}"}
+        elif line.startswith('<'):
+            job = {'html': line}
+        else:
+            job = {'path': line}
+        
+        job['index'] = index
+        yield job
+
+def convert_stream_job(converter, job, args):
+    """处理一条流式任务，返回结果字典"""
+    start = time.perf_counter()
+    image_format = (job.get('format') or args.format).upper()
+    width = int(job.get('width') or args.width)
+    height = int(job.get('height') or args.height)
+    quality = int(job.get('quality') or args.quality)
+    source = job.get('path') or '<html>'
+    
+    result = {'index': job['index'], 'input': source, 'output': None, 'ok': False}
+    if 'error' in job:
+        result['error'] = job['error']
+        return result
+    
+    if 'path' in job:
+        html_file = job['path']
+        default_output = converter.get_output_path(html_file, args.output_dir, image_format)
+    else:
+        html_file = None
+        extension = FORMAT_EXTENSIONS.get(image_format, '.png')
+        default_output = os.path.join(args.output_dir, f"document_{job['index'] + 1}{extension}")
+    output_file = normalize_output_path(job.get('output') or default_output, image_format)
+    
+    try:
+        if html_file is None:
+            # 直接渲染HTML文档内容，base_dir 用于解析相对路径的资源
+            base_url = path_to_file_url(job['base_dir']) if job.get('base_dir') else job.get('base_url')
+            result['ok'] = converter.convert_html_string(job['html'], output_file, image_format, width, height,
+                                                         quality, base_url=base_url)
+        else:
+            result['ok'] = converter.convert_html_to_image(html_file, output_file, image_format, width, height,
+                                                           quality)
+    except Exception as e:
+        result['error'] = str(e)
+    
+    if result['ok']:
+        outputs = converter.output_paths(output_file, image_format)
+        result['output'] = outputs[0]
+        if converter.variants:
+            result['outputs'] = outputs
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    return result
+
+def parse_size(value):
+    """解析文件大小参数，支持 K/M 后缀（例如 200K、1.5M），返回字节数"""
+    units = {'K': 1024, 'M': 1024 * 1024}
+    text = value.strip().upper().rstrip('B')
+    try:
+        if text and text[-1] in units:
+            size = int(float(text[:-1]) * units[text[-1]])
+        else:
+            size = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的文件大小: {value}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"文件大小必须大于0: {value}")
+    return size
+
+def build_arg_parser():
+    """命令行参数定义"""
+    parser = argparse.ArgumentParser(
+        description="HTML转图片工具 - 命令行模式（不带参数运行时启动图形界面）"
+    )
+    parser.add_argument('inputs', nargs='*', help="HTML文件、目录或通配符 (例如 'pages/**/*.html')")
+    parser.add_argument('-o', '--output-dir', default='.', help="输出目录 (默认当前目录)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="递归查找目录中的HTML文件")
+    parser.add_argument('-f', '--format', default='PNG', type=str.upper, choices=list(FORMAT_EXTENSIONS),
+                        help="图片格式 (默认 PNG，WEBP/AVIF需要Pillow支持)")
+    parser.add_argument('--width', type=int, default=1920, help="图片宽度 (默认 1920)")
+    parser.add_argument('--height', type=int, default=1080, help="图片高度 (默认 1080)")
+    parser.add_argument('-q', '--quality', type=int, default=95,
+                        help="JPEG/WEBP/AVIF质量 1-100，指定 --target-size 时为质量上限 (默认 95)")
+    parser.add_argument('--optimize', action='store_true', help="PNG/JPEG额外压缩优化（编码更慢，文件更小）")
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9', help="PNG压缩级别")
+    parser.add_argument('--progressive', action='store_true', help="输出渐进式JPEG")
+    parser.add_argument('--subsampling', choices=['4:4:4', '4:2:2', '4:2:0'], help="JPEG色度抽样")
+    parser.add_argument('--lossless', action='store_true', help="WEBP无损压缩")
+    parser.add_argument('--webp-method', type=int, choices=range(7), metavar='0-6',
+                        help="WEBP压缩方法，越大越慢、文件越小 (默认 4)")
+    parser.add_argument('--target-size', type=parse_size, metavar='SIZE',
+                        help="有损格式的目标文件大小，自动选择不超过该大小的最高质量 (例如 200K、1.5M)")
+    parser.add_argument('-w', '--workers', type=int, default=1, help="并行浏览器数量 (默认 1)")
+    parser.add_argument('--tabs', type=int, default=1, help="每个浏览器同时加载的标签页数量 (默认 1)")
+    parser.add_argument('--encode-processes', type=int, default=0, help="图片编码进程数 (默认 0，不使用进程池)")
+    parser.add_argument('--incremental', action='store_true', help="增量模式，跳过未变化的文件")
+    parser.add_argument('--force', action='store_true', help="增量模式下强制全部重新生成")
+    parser.add_argument('--resume', action='store_true',
+                        help="断点续传：跳过上次中断的批量转换中已经成功的文件")
+    parser.add_argument('--page-timeout', type=float, default=120,
+                        help="单个页面渲染的最长时间，超时后重新启动浏览器，秒 (默认 120)")
+    parser.add_argument('--retries', type=int, default=2, help="页面渲染失败后的重试次数 (默认 2)")
+    parser.add_argument('--recycle-pages', type=int, default=DEFAULT_RECYCLE_PAGES,
+                        help=f"每个浏览器处理多少个页面后换成新的浏览器，0 表示不限制 (默认 {DEFAULT_RECYCLE_PAGES})")
+    parser.add_argument('--recycle-rss', type=int, default=0, metavar='MB',
+                        help="浏览器内存占用超过该值（MB）时换成新的浏览器，需要 psutil (默认 0，不限制)")
+    parser.add_argument('--recycle-minutes', type=float, default=0,
+                        help="浏览器运行超过该时间（分钟）后换成新的浏览器 (默认 0，不限制)")
+    parser.add_argument('--cache-dir', help="渲染缓存目录")
+    parser.add_argument('--wait', default='smart', choices=['smart', 'fixed'], help="页面等待策略 (默认 smart)")
+    parser.add_argument('--ready-timeout', type=float, default=10.0, help="页面就绪的最长等待时间，秒 (默认 10)")
+    parser.add_argument('--intercept-assets', action='store_true',
+                        help="通过内存缓存提供本地资源，并拦截统计分析和远程字体等请求")
+    parser.add_argument('--block', action='append', metavar='PATTERN',
+                        help="拦截匹配该通配符的请求地址，可重复指定 (例如 '*cdn.example.com*')")
+    parser.add_argument('--scale', type=float, metavar='FACTOR',
+                        help="设备像素比，例如 2 输出两倍分辨率的图片 (默认取 --variant 中的最大倍数，否则为 1)")
+    parser.add_argument('--variant', action='append', metavar='SPEC',
+                        help="派生输出，可重复指定：'2x' 倍数、'300w' 固定宽度，或 '_thumb=300w' 自定义后缀；"
+                             "每个页面只渲染一次")
+    parser.add_argument('--tile-height', type=int, default=DEFAULT_TILE_HEIGHT,
+                        help=f"分块截图时每一块的高度 (默认 {DEFAULT_TILE_HEIGHT})")
+    parser.add_argument('--max-capture-height', type=int, default=DEFAULT_MAX_CAPTURE_HEIGHT,
+                        help=f"页面高度超过该值时分块截图 (默认 {DEFAULT_MAX_CAPTURE_HEIGHT})")
+    parser.add_argument('--report', metavar='PATH',
+                        help="批量转换结束后导出各阶段耗时的性能报告 (.json 或 .csv)")
+    parser.add_argument('--no-daemon', action='store_true', help="不连接渲染守护进程，总是启动本地浏览器")
+    parser.add_argument('--stdin', action='store_true',
+                        help="流式模式：从标准输入逐行读取路径、HTML文档或NDJSON任务，每完成一条就输出一行JSON结果")
+    parser.add_argument('--quiet', action='store_true', help="不输出转换日志")
+    return parser
+
+def run_cli(argv):
+    """命令行模式入口，返回进程退出码"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    
+    if not args.stdin and not args.inputs:
+        parser.error("请指定要转换的HTML文件，或使用 --stdin 从标准输入读取任务")
+    if args.width <= 0 or args.height <= 0:
+        parser.error("图片尺寸必须大于0")
+    if not 1 <= args.quality <= 100:
+        parser.error("JPEG质量必须在1-100之间")
+    if args.tile_height <= 0 or args.max_capture_height <= 0:
+        parser.error("分块高度和分块截图阈值必须大于0")
+    if args.scale is not None and args.scale <= 0:
+        parser.error("设备像素比必须大于0")
+    try:
+        variants = [parse_variant(spec) for spec in args.variant or []]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format not in available_formats():
+        parser.error(f"当前Pillow不支持 {args.format} 格式，可用格式: {', '.join(available_formats())}")
+    encode_options = {
+        'optimize': args.optimize or None,
+        'compress_level': args.compress_level,
+        'progressive': args.progressive or None,
+        'subsampling': args.subsampling,
+        'lossless': args.lossless or None,
+        'method': args.webp_method,
+        'target_size': args.target_size
+    }
+    
+    # 日志写到标准错误，标准输出只保留结果，便于接入管道
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr, flush=True)
+    
+    try:
+        converter = HTMLToImageConverter(log_callback=log, wait_strategy=args.wait,
+                                         ready_timeout=args.ready_timeout,
+                                         use_daemon=not args.no_daemon,
+                                         cache_dir=args.cache_dir,
+                                         intercept_assets=args.intercept_assets,
+                                         block_patterns=args.block,
+                                         tile_height=args.tile_height,
+                                         max_capture_height=args.max_capture_height,
+                                         encode_options=encode_options,
+                                         device_scale_factor=args.scale,
+                                         variants=variants,
+                                         page_timeout=args.page_timeout,
+                                         max_retries=args.retries,
+                                         recycle_pages=args.recycle_pages,
+                                         recycle_rss_mb=args.recycle_rss,
+                                         recycle_minutes=args.recycle_minutes)
+    except Exception as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    
+    try:
+        if args.stdin:
+            output_lock = threading.Lock()
+            failed = []
+            
+            def handle(worker, job):
+                result = convert_stream_job(worker, job, args)
+                with output_lock:
+                    if not result['ok']:
+                        failed.append(result['index'])
+                    print(json.dumps(result, ensure_ascii=False), flush=True)
+            
+            converter.run_pool(iter_stream_jobs(sys.stdin), handle, max(1, args.workers))
+            return 1 if failed else 0
+        
+        html_files = collect_input_files(args.inputs, args.recursive)
+        if not html_files:
+            print("❌ 没有找到HTML文件", file=sys.stderr)
+            return 1
+        
+        success_count, total_count = converter.batch_convert(
+            html_files,
+            args.output_dir,
+            args.format,
+            args.width,
+            args.height,
+            workers=args.workers,
+            tabs=args.tabs,
+            quality=args.quality,
+            encode_processes=args.encode_processes,
+            incremental=args.incremental,
+            force=args.force,
+            report_path=args.report,
+            resume=args.resume
+        )
+        return 0 if success_count == total_count else 1
+    finally:
+        converter.close()
+
 def main():
-    """主函数"""
+    """主函数：带参数时运行命令行模式，否则启动图形界面"""
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    
+    if tk is None:
+        print("❌ 当前环境没有安装tkinter，无法启动图形界面，请使用命令行模式（--help 查看用法）")
+        sys.exit(1)
+    
     try:
         app = HTMLToImageGUI()
         app.run()
@@ -513,4 +3644,6 @@ def main():
         messagebox.showerror("启动错误", f"程序启动失败:\n{str(e)}")
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，编码进程池需要此调用才能正常启动子进程
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTML转图片渲染守护进程
+常驻后台并保持若干个已启动的浏览器，界面、脚本和库调用在守护进程运行时会自动连接，
+省去每次转换都重新启动浏览器的时间
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import queue
+import hmac
+import argparse
+import secrets
+import threading
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from html_to_image import (HTMLToImageConverter, DEFAULT_DAEMON_ADDRESS, DAEMON_TOKEN_HEADER, daemon_token_path,
+                           encode_image)
+
+def _choice(*choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"可选值为 {', '.join(choices)}")
+        return value
+    return parse
+
+def _number(convert, minimum=0, allow_minimum=False):
+    def parse(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError("必须为数字")
+        value = convert(value)
+        if not math.isfinite(value):
+            raise ValueError("必须为有限的数字")
+        if value < minimum or (value == minimum and not allow_minimum):
+            raise ValueError(f"必须{'不小于' if allow_minimum else '大于'} {minimum}")
+        return value
+    return parse
+
+# 可以由客户端按请求覆盖的转换器设置及其取值检查，取值无效时在渲染之前返回400
+REQUEST_OPTIONS = {
+    'wait_strategy': _choice('smart', 'fixed'),
+    'ready_timeout': _number(float),
+    'quiet_period': _number(float, allow_minimum=True),
+    'tile_height': _number(int),
+    'max_capture_height': _number(int),
+}
+
+def parse_request_options(payload):
+    """检查并转换请求中的转换器设置，取值无效时抛出 ValueError"""
+    options = {}
+    for key, parse in REQUEST_OPTIONS.items():
+        if key in payload:
+            try:
+                options[key] = parse(payload[key])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{key} 无效: {payload[key]!r}（{e}）")
+    return options
+
+# 只接受发往本机地址的请求，防止网页通过DNS重绑定访问守护进程
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '[::1]')
+
+def is_within(path, roots):
+    """路径是否位于允许的目录之内"""
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+class BrowserPool:
+    """常驻浏览器池：每个浏览器同一时间只处理一个渲染请求"""
+
+    def __init__(self, size, log):
+        """
+        参数:
+        size: 常驻浏览器数量
+        log: 日志函数
+        """
+        self.log = log
+        self.converters = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+        # 并行启动所有浏览器
+        threads = [threading.Thread(target=self._start_browser, args=(index,), daemon=True) for index in range(size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if not self.converters:
+            raise Exception("没有可用的浏览器，守护进程无法启动")
+
+    def _start_browser(self, index):
+        try:
+            converter = HTMLToImageConverter(log_callback=self.log, name=f"B{index + 1}", use_daemon=False)
+        except Exception as e:
+            self.log(f"⚠️  浏览器 B{index + 1} 启动失败: {e}")
+            return
+        with self._lock:
+            self.converters.append(converter)
+        self._idle.put(converter)
+
+    def acquire(self):
+        """取出一个空闲浏览器，全部忙碌时等待"""
+        return self._idle.get()
+
+    def release(self, converter):
+        """归还浏览器"""
+        self._idle.put(converter)
+
+    @property
+    def idle_count(self):
+        return self._idle.qsize()
+
+    def close(self):
+        """关闭所有浏览器"""
+        for converter in self.converters:
+            try:
+                converter.close()
+            except Exception:
+                pass
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    渲染请求处理:
+    GET  /health  返回守护进程状态
+    POST /render  请求体为JSON {html_file 或 html, width, height, ...}，返回PNG图片数据
+    """
+
+    server_version = 'HTML2ImageDaemon/1.0'
+
+    def _check_request(self):
+        """检查Host和访问令牌，不通过时返回错误响应并返回False"""
+        host = (self.headers.get('Host') or '').lower()
+        if host.rsplit(':', 1)[0] not in LOOPBACK_HOSTS:
+            self._send_json(403, {'error': '只接受本机地址的请求'})
+            return False
+        token = self.headers.get(DAEMON_TOKEN_HEADER) or ''
+        if not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+            self._send_json(401, {'error': '访问令牌无效'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._check_request():
+            return
+        if self.path != '/health':
+            self._send_json(404, {'error': '未知的请求路径'})
+            return
+        pool = self.server.pool
+        self._send_json(200, {
+            'status': 'ok',
+            'browsers': len(pool.converters),
+            'idle': pool.idle_count
+        })
+
+    def do_POST(self):
+        if not self._check_request():
+            return
+        if self.path != '/render':
+            self._send_json(404, {'error': '未知的请求路径'})
+            return
+        # 只接受JSON请求体，浏览器无需预检即可发出的 text/plain 等跨站请求一律拒绝
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            self._send_json(415, {'error': '请求体必须为 application/json'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            if 'html' not in payload and 'html_file' not in payload:
+                raise KeyError('html_file')
+            if not isinstance(payload.get('html', payload.get('html_file')), str):
+                raise ValueError('html / html_file 必须为字符串')
+            width = int(payload.get('width', 1920))
+            height = int(payload.get('height', 1080))
+            options = parse_request_options(payload)
+        except Exception as e:
+            self._send_json(400, {'error': f"请求参数无效: {e}"})
+            return
+
+        # 要渲染的HTML文件同样必须位于允许的目录内
+        html_file = payload.get('html_file')
+        if 'html' not in payload and not is_within(html_file, self.server.allowed_roots):
+            self._send_json(403, {'error': f"HTML文件不在允许的目录内: {html_file}"})
+            return
+
+        # 本地文件作为基础地址时必须位于允许的目录内，避免渲染的HTML读取其他本地文件
+        base_url = payload.get('base_url') or ''
+        if base_url.lower().startswith('file:'):
+            base_path = urllib.request.url2pathname(urllib.parse.urlparse(base_url).path)
+            if not is_within(base_path, self.server.allowed_roots):
+                self._send_json(403, {'error': f"基础地址不在允许的目录内: {base_url}"})
+                return
+
+        try:
+            png_data = self._render(width, height, payload, options)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(png_data)))
+        self.end_headers()
+        self.wfile.write(png_data)
+
+    def _render(self, width, height, payload, options):
+        """借用一个常驻浏览器按请求的设置完成渲染，结束后恢复其默认设置并归还"""
+        pool = self.server.pool
+        converter = pool.acquire()
+        defaults = {key: getattr(converter, key) for key in REQUEST_OPTIONS}
+        try:
+            # 常驻浏览器按回收策略定期换新，避免长时间运行后内存不断增长
+            converter.maybe_recycle_driver()
+            for key, value in options.items():
+                setattr(converter, key, value)
+            start = time.perf_counter()
+            if 'html' in payload:
+                png_data = converter.render_html_string_to_png(payload['html'], width, height, payload.get('base_url'))
+                name = "HTML文档"
+            else:
+                png_data = converter.render_html_to_png(payload['html_file'], width, height)
+                name = os.path.basename(payload['html_file'])
+            # 分块截图的结果需要先编码为PNG再返回
+            png_data = encode_image(png_data, 'PNG')
+            converter.log(f"✅ 渲染完成: {name} ({time.perf_counter() - start:.2f}秒)")
+            return png_data
+        except Exception:
+            # 浏览器崩溃或卡死时重新启动后再归还，避免之后的请求都分配到失效的浏览器
+            if not converter.is_driver_healthy():
+                try:
+                    converter.restart_driver("常驻浏览器无响应")
+                except Exception as e:
+                    converter.log(f"⚠️  重新启动浏览器失败: {e}")
+            raise
+        finally:
+            for key, value in defaults.items():
+                setattr(converter, key, value)
+            pool.release(converter)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 请求日志由转换器输出，这里不再重复打印
+        pass
+
+def main():
+    """主函数"""
+    default_host, default_port = (os.environ.get('HTML2IMG_DAEMON') or DEFAULT_DAEMON_ADDRESS).rsplit(':', 1)
+
+    parser = argparse.ArgumentParser(description="HTML转图片渲染守护进程")
+    parser.add_argument('--host', default=default_host, help=f"监听地址 (默认 {default_host})")
+    parser.add_argument('--port', type=int, default=int(default_port), help=f"监听端口 (默认 {default_port})")
+    parser.add_argument('--browsers', type=int, default=2, help="常驻浏览器数量 (默认 2)")
+    parser.add_argument('--allow-root', action='append', metavar='DIR',
+                        help="允许渲染的HTML文件和 file:// 基础地址所在的目录，可重复指定 (默认当前目录)")
+    args = parser.parse_args()
+
+    print("=== HTML转图片渲染守护进程 ===")
+    print(f"🚀 正在启动 {args.browsers} 个常驻浏览器...")
+
+    try:
+        pool = BrowserPool(max(1, args.browsers), print)
+    except Exception as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    server = ThreadingHTTPServer((args.host, args.port), RenderRequestHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    server.allowed_roots = [os.path.abspath(root) for root in args.allow_root or [os.getcwd()]]
+
+    # 随机访问令牌写入只有当前用户可读的文件，本机的客户端读取后才能使用守护进程
+    server.token = secrets.token_hex(16)
+    token_path = daemon_token_path(f"{args.host}:{args.port}")
+    try:
+        os.remove(token_path)
+    except OSError:
+        pass
+    fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(server.token)
+
+    print(f"✅ 守护进程已就绪: http://{args.host}:{args.port} (浏览器数量: {len(pool.converters)})")
+    print("💡 按 Ctrl+C 停止守护进程")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  正在停止守护进程...")
+    finally:
+        server.server_close()
+        pool.close()
+        try:
+            os.remove(token_path)
+        except OSError:
+            pass
+        print("守护进程已停止")
+
+if __name__ == "__main__":
+    main()
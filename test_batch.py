@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+断点续传日志测试：中断后继续、源文件修改、参数变化和正常结束后的清理
+
+不需要启动浏览器，运行: python -m pytest -q test_batch.py
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+pytest.importorskip('PIL')
+
+from html_to_image import BatchJournal
+
+PARAMS = {'format': 'PNG', 'width': 1200, 'height': 800, 'quality': 95}
+
+
+def write_file(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return str(path)
+
+
+def bump_mtime(path, seconds=10):
+    """修改文件的修改时间，模拟编辑或重新检出"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+@pytest.fixture
+def page(tmp_path):
+    """带一个本地样式表的HTML文件及其已存在的输出文件"""
+    write_file(tmp_path / 'style.css', 'body { color: red; }')
+    html_file = write_file(tmp_path / 'page.html', '<link rel="stylesheet" href="style.css"><p>hello</p>')
+    output_file = write_file(tmp_path / 'page.png', 'png')
+    return html_file, output_file
+
+
+def test_journal_resumes_completed_files(tmp_path, page):
+    html_file, output_file = page
+    other_file = write_file(tmp_path / 'other.html', '<p>other</p>')
+    output_dir = str(tmp_path)
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.record(html_file, output_file, True)
+    journal.record(other_file, str(tmp_path / 'other.png'), False)
+    # 模拟中断：没有正常结束
+    journal.close()
+
+    resumed = BatchJournal(output_dir, PARAMS, resume=True)
+    assert resumed.is_done(html_file, [output_file])
+    assert not resumed.is_done(other_file, [str(tmp_path / 'other.png')])
+    # 输出文件被删除后需要重新转换
+    assert not resumed.is_done(html_file, [str(tmp_path / 'missing.png')])
+    resumed.close()
+
+
+def test_journal_ignores_edited_sources_and_other_params(tmp_path, page):
+    html_file, output_file = page
+    output_dir = str(tmp_path)
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.record(html_file, output_file, True)
+    journal.close()
+
+    other_params = BatchJournal(output_dir, dict(PARAMS, width=800), resume=True)
+    assert not other_params.is_done(html_file, [output_file])
+    other_params.close()
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.record(html_file, output_file, True)
+    journal.close()
+    bump_mtime(html_file)
+    resumed = BatchJournal(output_dir, PARAMS, resume=True)
+    assert not resumed.is_done(html_file, [output_file])
+    resumed.close()
+
+
+def test_journal_is_removed_after_completion(tmp_path, page):
+    html_file, output_file = page
+    output_dir = str(tmp_path)
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.record(html_file, output_file, True)
+    journal.close(complete=True)
+    assert not os.path.exists(journal.path)
+
+    resumed = BatchJournal(output_dir, PARAMS, resume=True)
+    assert not resumed.interrupted
+    assert not resumed.is_done(html_file, [output_file])
+    resumed.close()
+
+
+def test_run_without_resume_keeps_interrupted_journal(tmp_path, page):
+    html_file, output_file = page
+    other_file = write_file(tmp_path / 'other.html', '<p>other</p>')
+    other_output = write_file(tmp_path / 'other.png', 'png')
+    output_dir = str(tmp_path)
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.record(html_file, output_file, True)
+    journal.close()
+
+    # 不使用断点续传：不跳过任何文件，但保留之前的记录
+    rerun = BatchJournal(output_dir, PARAMS)
+    assert rerun.interrupted
+    assert not rerun.is_done(html_file, [output_file])
+    rerun.record(other_file, other_output, True)
+    rerun.close()
+
+    resumed = BatchJournal(output_dir, PARAMS, resume=True)
+    assert resumed.is_done(html_file, [output_file])
+    assert resumed.is_done(other_file, [other_output])
+    resumed.close()
+
+
+def test_journal_appends_after_partial_line(tmp_path, page):
+    html_file, output_file = page
+    output_dir = str(tmp_path)
+
+    journal = BatchJournal(output_dir, PARAMS)
+    journal.close()
+    # 模拟写入一半时被强制结束
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"file": "/broken')
+
+    resumed = BatchJournal(output_dir, PARAMS, resume=True)
+    resumed.record(html_file, output_file, True)
+    resumed.close()
+
+    again = BatchJournal(output_dir, PARAMS, resume=True)
+    assert again.is_done(html_file, [output_file])
+    again.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片编码测试：分块画布的释放和目标文件大小编码
+
+不需要启动浏览器，运行: python -m pytest -q test_encode.py
+"""
+
+import io
+import os
+import random
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+Image = pytest.importorskip('PIL.Image')
+
+from html_to_image import TiledCanvas, encode_and_save, encode_image, parse_variant, _encode_to_target_size
+
+
+def make_canvas(width=40, height=30):
+    canvas = TiledCanvas(width, height)
+    canvas.write_rows(Image.new('RGB', (width, height // 2), (255, 0, 0)), 0)
+    canvas.fill_rows(height // 2)
+    return canvas
+
+
+def test_encode_and_save_closes_canvas(tmp_path):
+    canvas = make_canvas()
+    output_path = encode_and_save(canvas, str(tmp_path / 'page.png'))
+    assert canvas.closed
+    assert Image.open(output_path).size == (40, 30)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_encode_and_save_closes_canvas_after_all_variants(tmp_path):
+    canvas = make_canvas()
+    variants = [parse_variant('1x'), parse_variant('20w')]
+    encode_and_save(canvas, str(tmp_path / 'page.png'), variants=variants)
+    assert canvas.closed
+    assert Image.open(tmp_path / 'page@1x.png').size == (40, 30)
+    assert Image.open(tmp_path / 'page_20w.png').size == (20, 15)
+
+
+def test_encode_image_closes_canvas():
+    canvas = make_canvas()
+    data = encode_image(canvas, 'JPEG', 80)
+    assert canvas.closed
+    assert data[:2] == b'\xff\xd8'
+
+
+def noisy_image(size=(160, 120), seed=1):
+    """随机噪声图片，压缩率低，不同质量的编码大小差别明显"""
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', size, bytes(rng.randrange(256) for _ in range(size[0] * size[1] * 3)))
+
+
+def encode(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=False, progressive=False)
+    return buffer.getvalue()
+
+
+def test_encode_to_target_size_keeps_quality_when_small_enough():
+    img = noisy_image()
+    data = _encode_to_target_size(img, 'JPEG', 90, {}, 10 * 1024 * 1024)
+    assert data == encode(img, 90)
+
+
+def test_encode_to_target_size_finds_highest_fitting_quality():
+    img = noisy_image()
+    target = (len(encode(img, 90)) + len(encode(img, 10))) // 2
+    data = _encode_to_target_size(img, 'JPEG', 90, {}, target)
+    assert len(data) <= target
+    # 结果是某个质量的完整编码，且质量再高一级就会超过目标大小
+    quality = next(value for value in range(1, 91) if encode(img, value) == data)
+    assert len(encode(img, quality + 1)) > target
+    assert Image.open(io.BytesIO(data)).size == img.size
+
+
+def test_encode_to_target_size_falls_back_to_lowest_quality():
+    img = noisy_image()
+    assert _encode_to_target_size(img, 'JPEG', 90, {}, 1) == encode(img, 1)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量转换清单测试：源文件、引用资源和渲染参数变化的检测
+
+不需要启动浏览器，运行: python -m pytest -q test_manifest.py
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+pytest.importorskip('PIL')
+
+from html_to_image import BatchManifest
+
+PARAMS = {'format': 'PNG', 'width': 1200, 'height': 800, 'quality': 95}
+
+
+def write_file(path, content):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return str(path)
+
+
+def bump_mtime(path, seconds=10):
+    """修改文件的修改时间，模拟编辑或重新检出"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+@pytest.fixture
+def page(tmp_path):
+    """带一个本地样式表的HTML文件及其已存在的输出文件"""
+    write_file(tmp_path / 'style.css', 'body { color: red; }')
+    html_file = write_file(tmp_path / 'page.html', '<link rel="stylesheet" href="style.css"><p>hello</p>')
+    output_file = write_file(tmp_path / 'page.png', 'png')
+    return html_file, output_file
+
+
+def test_manifest_up_to_date_after_record(tmp_path, page):
+    html_file, output_file = page
+    manifest = BatchManifest(str(tmp_path))
+    assert not manifest.is_up_to_date(html_file, output_file, PARAMS)
+
+    manifest.record(html_file, output_file, PARAMS)
+    manifest.save()
+    reloaded = BatchManifest(str(tmp_path))
+    assert reloaded.is_up_to_date(html_file, output_file, PARAMS)
+    assert reloaded.is_up_to_date(html_file, [output_file], PARAMS)
+
+
+def test_manifest_detects_changes(tmp_path, page):
+    html_file, output_file = page
+    manifest = BatchManifest(str(tmp_path))
+    manifest.record(html_file, output_file, PARAMS)
+
+    # 参数变化、输出文件缺失都需要重新生成
+    assert not manifest.is_up_to_date(html_file, output_file, dict(PARAMS, quality=80))
+    assert not manifest.is_up_to_date(html_file, [output_file, str(tmp_path / 'page@2x.png')], PARAMS)
+
+    # 只有修改时间变化、内容相同时仍视为未变化
+    bump_mtime(html_file)
+    assert manifest.is_up_to_date(html_file, output_file, PARAMS)
+
+    # 内容变化但大小相同
+    write_file(html_file, '<link rel="stylesheet" href="style.css"><p>world</p>')
+    bump_mtime(html_file, 20)
+    assert not manifest.is_up_to_date(html_file, output_file, PARAMS)
+
+
+def test_manifest_detects_asset_changes(tmp_path, page):
+    html_file, output_file = page
+    manifest = BatchManifest(str(tmp_path))
+    manifest.record(html_file, output_file, PARAMS)
+
+    write_file(tmp_path / 'style.css', 'body { color: blue; }')
+    bump_mtime(str(tmp_path / 'style.css'))
+    assert not manifest.is_up_to_date(html_file, output_file, PARAMS)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+派生输出测试：描述解析、输出文件名和设备像素比的调整
+
+不需要启动浏览器，运行: python -m pytest -q test_variants.py
+"""
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('webdriver_manager')
+pytest.importorskip('PIL')
+
+from html_to_image import HTMLToImageConverter, parse_variant, variant_output_path
+
+
+def test_parse_variant():
+    assert parse_variant('2x') == {'name': '@2x', 'scale': 2.0}
+    assert parse_variant(' 1.5X ') == {'name': '@1.5x', 'scale': 1.5}
+    assert parse_variant('300w') == {'name': '_300w', 'width': 300}
+    assert parse_variant('_thumb=300w') == {'name': '_thumb', 'width': 300}
+    assert parse_variant({'name': '@3x', 'scale': 3}) == {'name': '@3x', 'scale': 3}
+
+
+@pytest.mark.parametrize('spec', ['', 'abc', '2y', '0x', '-1x', 'w', 'x', {'name': '', 'scale': 2}, {'name': '@0x'}])
+def test_parse_variant_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_variant(spec)
+
+
+def test_variant_output_path():
+    assert variant_output_path('out/page.png', '@2x') == 'out/page@2x.png'
+    assert variant_output_path('out/page.jpg', '_300w') == 'out/page_300w.jpg'
+
+
+class NoBrowserConverter(HTMLToImageConverter):
+    """不启动浏览器的转换器，记录每次启动浏览器时的设备像素比"""
+
+    def __init__(self, **kwargs):
+        self.driver_starts = []
+        super().__init__(log_callback=lambda message: None, use_daemon=False, **kwargs)
+
+    def setup_driver(self):
+        self.driver_starts.append(self.device_scale_factor)
+
+
+def test_set_variants_raises_and_resets_scale_factor():
+    converter = NoBrowserConverter()
+    assert converter.device_scale_factor == 1
+
+    converter.set_variants(['1x', '2x'])
+    assert converter.device_scale_factor == 2
+    # 需要的倍数降低时继续使用当前浏览器
+    converter.set_variants(['1x'])
+    assert converter.device_scale_factor == 2
+    converter.set_variants([])
+    assert converter.device_scale_factor == 1
+    assert converter.driver_starts == [1, 2, 1]
+
+
+def test_set_variants_keeps_explicit_scale_factor():
+    converter = NoBrowserConverter(device_scale_factor=3)
+    converter.set_variants([])
+    assert converter.device_scale_factor == 3
+    assert converter.driver_starts == [3]